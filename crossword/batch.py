@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+import sys
+import time
+
+from generate import *
+
+# Vocabulary shared by batch workers, set by `init_batch_worker`
+worker_vocabulary = None
+
+
+def main():
+
+    # Check usage
+    if len(sys.argv) not in [4, 5]:
+        sys.exit("Usage: python batch.py words structures output [workers]")
+
+    # Parse command-line arguments
+    words = sys.argv[1]
+    structures = sys.argv[2]
+    output = sys.argv[3]
+    workers = int(sys.argv[4]) if len(sys.argv) == 5 else os.cpu_count()
+
+    # Load and index the dictionary once for every puzzle
+    start = time.perf_counter()
+    vocabulary = Vocabulary(words)
+    print(f"Loaded {len(vocabulary)} words "
+          f"in {time.perf_counter() - start:.3f}s")
+
+    # Solve puzzles as their structure files arrive
+    os.makedirs(output, exist_ok=True)
+    jobs = ((path, output) for path in structure_files(structures))
+    total = time.perf_counter()
+    count = 0
+    with multiprocessing.Pool(
+        workers, initializer=init_batch_worker, initargs=(vocabulary,)
+    ) as pool:
+        for path, solved, seconds, error in pool.imap_unordered(
+            solve_structure, jobs
+        ):
+            count += 1
+            if error is not None:
+                status = f"error ({error})"
+            else:
+                status = "solved" if solved else "no solution"
+            print(f"{path}: {status} in {seconds:.3f}s")
+    print(f"{count} puzzles in {time.perf_counter() - total:.3f}s")
+
+
+def structure_files(structures):
+    """
+    Yield paths of structure files to solve: every .txt file in directory
+    `structures`, or one path per line of standard input if it is "-".
+    """
+    if structures == "-":
+        for line in sys.stdin:
+            if line.strip():
+                yield line.strip()
+        return
+    for filename in sorted(os.listdir(structures)):
+        if filename.endswith(".txt"):
+            yield os.path.join(structures, filename)
+
+
+def init_batch_worker(vocabulary):
+    """
+    Store the shared vocabulary for use by `solve_structure`.
+    """
+    global worker_vocabulary
+    worker_vocabulary = vocabulary
+
+
+def solve_structure(job):
+    """
+    Solve the structure file of a batch job, given as (path, output), and
+    write its assignment as text and as an image into directory `output`.
+    Return (path, solved, seconds taken, error), where `error` describes
+    why the puzzle could not be handled, or is None. Errors are reported
+    rather than raised so that one bad file does not stop the batch.
+    """
+    path, output = job
+    start = time.perf_counter()
+    try:
+        crossword = Crossword(path, worker_vocabulary)
+        creator = CrosswordCreator(crossword)
+        assignment = creator.solve()
+
+        if assignment is not None:
+            name = os.path.splitext(os.path.basename(path))[0]
+            with open(os.path.join(output, f"{name}.txt"), "w") as f:
+                creator.print(assignment, file=f)
+            creator.save(assignment, os.path.join(output, f"{name}.png"))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        return path, False, time.perf_counter() - start, error
+    return path, assignment is not None, time.perf_counter() - start, None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from generate import *
+
+# Synthetic grids: side length, fraction of blocked cells, and longest
+# run of open cells (longer runs are broken up by more blocked cells)
+SIZES = [5, 9, 13]
+DENSITIES = [0.25, 0.35]
+MAX_RUN = 7
+
+# Grids drawn for each size and density until one survives initial arc
+# consistency with the smallest dictionary
+ATTEMPTS = 200
+
+# Number of words sampled from the dictionary for each run
+DICTIONARY_SIZES = [1000, 3000, 10000]
+
+# Search configurations, as (inference, heuristic)
+CONFIGS = [
+    (None, "degree"),
+    ("forward", "degree"),
+    ("mac", "mrv"),
+    ("mac", "degree"),
+    ("mac", "domwdeg"),
+]
+
+# Values tried before a run is abandoned
+NODE_LIMIT = 20000
+
+SEED = 50
+
+
+def main():
+
+    # Check usage
+    args = sys.argv[1:]
+    memory = "--memory" in args
+    if memory:
+        args.remove("--memory")
+    if len(args) != 2:
+        sys.exit("Usage: python benchmark.py words output.json [--memory]")
+    words = sorted(Vocabulary(args[0]))
+
+    results = []
+    rng = random.Random(SEED)
+    with tempfile.TemporaryDirectory() as directory:
+
+        # Dictionaries are prefixes of one shuffled word list, so each
+        # contains the smaller ones, and a grid that survives initial arc
+        # consistency with the smallest survives it with all of them
+        rng.shuffle(words)
+        counts = [count for count in DICTIONARY_SIZES if count <= len(words)]
+        dictionaries = dict()
+        for count in counts:
+            dictionaries[count] = os.path.join(directory, f"{count}.txt")
+            with open(dictionaries[count], "w") as f:
+                f.write("\n".join(words[:count]))
+
+        for size in SIZES:
+            for density in DENSITIES:
+                structure = os.path.join(directory, f"{size}-{density}.txt")
+                attempts = draw_structure(
+                    structure, size, density, dictionaries[counts[0]], rng
+                )
+
+                for count in counts:
+                    crossword = Crossword(structure, dictionaries[count])
+
+                    for inference, heuristic in CONFIGS:
+                        result = run(crossword, inference, heuristic, memory)
+                        result.update({
+                            "size": size,
+                            "density": density,
+                            "words": count,
+                            "attempts": attempts,
+                        })
+                        results.append(result)
+                        print(
+                            f"{size}x{size} {density} {count} words "
+                            f"{inference}/{heuristic}: "
+                            f"{result['seconds']:.3f}s, "
+                            f"{result['nodes']} nodes"
+                        )
+
+    with open(args[1], "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def draw_structure(filename, size, density, dictionary, rng):
+    """
+    Write synthetic structures to `filename` until one survives node and
+    arc consistency with the words in `dictionary`, or `ATTEMPTS` have
+    been drawn, and return the number drawn. The last structure is kept
+    either way; runs on it record whether it was refuted.
+    """
+    for attempt in range(1, ATTEMPTS + 1):
+        with open(filename, "w") as f:
+            f.write(synthetic_structure(size, density, rng))
+        if not refuted(Crossword(filename, dictionary)):
+            break
+    return attempt
+
+
+def synthetic_structure(size, density, rng):
+    """
+    Return the text of a `size` x `size` structure file with roughly
+    `density` of its cells blocked, placed with rotational symmetry, and
+    no run of more than `MAX_RUN` open cells.
+    """
+    grid = [["_"] * size for _ in range(size)]
+
+    def block(i, j):
+        grid[i][j] = "#"
+        grid[size - 1 - i][size - 1 - j] = "#"
+
+    for i in range(size):
+        for j in range(size):
+            if (i, j) <= (size - 1 - i, size - 1 - j) and rng.random() < density:
+                block(i, j)
+
+    # Break up long runs, across and then down, until none are left
+    changed = True
+    while changed:
+        changed = False
+        for cells in (
+            [[(i, j) for j in range(size)] for i in range(size)]
+            + [[(i, j) for i in range(size)] for j in range(size)]
+        ):
+            run = 0
+            for i, j in cells:
+                run = run + 1 if grid[i][j] == "_" else 0
+                if run > MAX_RUN:
+                    block(i, j)
+                    run = 0
+                    changed = True
+    return "\n".join("".join(row) for row in grid) + "\n"
+
+
+def refuted(crossword):
+    """
+    Return True if node and arc consistency alone show that `crossword`
+    has no solution.
+    """
+    creator = CrosswordCreator(crossword)
+    creator.enforce_node_consistency()
+    return not creator.ac3()
+
+
+def run(crossword, inference, heuristic, memory=False):
+    """
+    Solve `crossword` under one configuration, returning a dict of search
+    counters and wall time, and with `memory` the peak traced memory of a
+    second solve.
+    """
+    def solve():
+        creator = CrosswordCreator(
+            crossword, inference=inference, heuristic=heuristic,
+            node_limit=NODE_LIMIT
+        )
+        return creator, creator.solve()
+
+    (creator, assignment), seconds = timed(solve)
+    result = {
+        "variables": len(crossword.variables),
+        "inference": inference,
+        "heuristic": heuristic,
+        "refuted": refuted(crossword),
+        "solved": assignment is not None,
+        "completed": not creator.out_of_nodes(),
+        "nodes": creator.stats["nodes"],
+        "backtracks": creator.stats["backtracks"],
+        "revise_calls": creator.stats["revise_calls"],
+        "revisions": creator.stats["revisions"],
+        "arcs": creator.stats["arcs"],
+        "constraint_checks": creator.stats["constraint_checks"],
+        "seconds": seconds,
+    }
+    if memory:
+        result["peak_bytes"] = peak_memory(solve)
+    return result
+
+
+def timed(function, *args):
+    """
+    Call `function` with `args`, returning its result and wall time.
+    """
+    start = time.perf_counter()
+    value = function(*args)
+    return value, time.perf_counter() - start
+
+
+def peak_memory(function, *args):
+    """
+    Call `function` with `args` under tracemalloc and return its peak
+    traced memory in bytes. Tracing slows the call down several times,
+    so it is kept apart from the calls that are timed.
+    """
+    tracemalloc.start()
+    try:
+        function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import sys
+import time
+
+from crossword import Vocabulary
+
+
+def main():
+
+    # Check usage
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python compile_words.py words output")
+
+    # Index the word list and write it in compiled form
+    start = time.perf_counter()
+    vocabulary = Vocabulary(sys.argv[1])
+    vocabulary.compile(sys.argv[2])
+    print(f"Compiled {len(vocabulary)} words "
+          f"in {time.perf_counter() - start:.3f}s")
+
+    # Check that the compiled file loads back
+    start = time.perf_counter()
+    compiled = Vocabulary(sys.argv[2])
+    print(f"Loaded {len(compiled)} words "
+          f"in {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,18 @@
+import bisect
+import collections.abc
+import itertools
+import mmap
+import struct
+
+
+def popcount(bits):
+    """
+    Return the number of set bits of a bitset, such as a domain or an
+    entry of `letter_bits`. (`int.bit_count` would need Python 3.10.)
+    """
+    return bin(bits).count("1")
+
+
 class Variable():
 
     ACROSS = "across"
@@ -35,6 +50,241 @@ class Variable():
         return f"Variable({self.i}, {self.j}, {direction}, {self.length})"
 
 
+class Vocabulary():
+
+    # Compiled vocabulary files start with MAGIC, then a header holding
+    # FORMAT_VERSION, the character width (1 for Latin-1 words, 4 for
+    # UTF-32), the number of distinct letters and the number of lengths
+    MAGIC = b"CWVOCAB\0"
+    FORMAT_VERSION = 1
+    HEADER = struct.Struct("<8sHHII")
+
+    # One entry per word length: length, word count, offset of the sorted
+    # fixed-width words, offset of the positional letter bitmaps
+    LENGTH_ENTRY = struct.Struct("<IIQQ")
+
+    def __init__(self, words_file):
+        """
+        Load a word list and index it for bitset domains.
+
+        A vocabulary can be shared by many `Crossword` objects (and worker
+        processes), so that the word file is read and indexed only once.
+        `words_file` is either a plain list of words, one per line, or a
+        file written by `Vocabulary.compile`, which is memory-mapped.
+        """
+        self.path = words_file
+        self.buffer = None
+        with open(words_file, "rb") as f:
+            compiled = f.read(len(Vocabulary.MAGIC)) == Vocabulary.MAGIC
+        if compiled:
+            self.load(words_file)
+            return
+
+        with open(words_file) as f:
+            words = set(f.read().upper().splitlines())
+
+        # Index vocabulary for bitset domains
+        # Words of each length get ids 0..n-1 in `self.words_by_length`;
+        # a domain is an int whose bit k is set if word k is still possible.
+        # `self.letter_bits[length, position, letter]` is the bitset of
+        # words of that length with `letter` at `position`.
+        self.words_by_length = dict()
+        for word in sorted(words):
+            self.words_by_length.setdefault(len(word), []).append(word)
+        self.letters = sorted(set(itertools.chain.from_iterable(words)))
+        self.letter_bits = dict()
+        for length, words in self.words_by_length.items():
+            self.letter_bits.update(self.index_words(length, words))
+
+    def __len__(self):
+        return sum(len(words) for words in self.words_by_length.values())
+
+    def __iter__(self):
+        for words in self.words_by_length.values():
+            yield from words
+
+    def __contains__(self, word):
+        return self.word_id(word) is not None
+
+    def __getstate__(self):
+        # Compiled vocabularies are pickled by path and mapped again
+        if self.buffer is None:
+            return self.__dict__
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        if "buffer" in state:
+            self.__dict__.update(state)
+        else:
+            self.path = state["path"]
+            self.load(self.path)
+
+    @staticmethod
+    def index_words(length, words):
+        """
+        Return dict mapping (length, position, letter) to the bitset of
+        `words` (all of length `length`) with `letter` at `position`.
+        """
+        size = len(words) // 8 + 1
+        buffers = dict()
+        for k, word in enumerate(words):
+            byte, bit = k >> 3, 1 << (k & 7)
+            for position, letter in enumerate(word):
+                key = (length, position, letter)
+                if key not in buffers:
+                    buffers[key] = bytearray(size)
+                buffers[key][byte] |= bit
+        return {
+            key: int.from_bytes(buffer, "little")
+            for key, buffer in buffers.items()
+        }
+
+    def compile(self, filename):
+        """
+        Write this vocabulary to `filename` in the compiled format, which
+        `Vocabulary(filename)` memory-maps instead of parsing and indexing.
+        """
+        width = 1 if all(ord(c) < 256 for c in self.letters) else 4
+        encoding = "latin-1" if width == 1 else "utf-32-le"
+        letters = "".join(self.letters).encode(encoding)
+        lengths = sorted(self.words_by_length)
+
+        offset = (
+            Vocabulary.HEADER.size + len(letters)
+            + Vocabulary.LENGTH_ENTRY.size * len(lengths)
+        )
+        entries = []
+        for length in lengths:
+            count = len(self.words_by_length[length])
+            words_offset = offset
+            offset += count * length * width
+            entries.append((length, count, words_offset, offset))
+            offset += length * len(self.letters) * (count // 8 + 1)
+
+        with open(filename, "wb") as f:
+            f.write(Vocabulary.HEADER.pack(
+                Vocabulary.MAGIC, Vocabulary.FORMAT_VERSION, width,
+                len(self.letters), len(lengths)
+            ))
+            f.write(letters)
+            for entry in entries:
+                f.write(Vocabulary.LENGTH_ENTRY.pack(*entry))
+            for length, count, _, _ in entries:
+                words = self.words_by_length[length]
+                f.write("".join(words).encode(encoding))
+                size = count // 8 + 1
+                for position in range(length):
+                    for letter in self.letters:
+                        bits = self.letter_bits.get((length, position, letter), 0)
+                        f.write(bits.to_bytes(size, "little"))
+
+    def load(self, filename):
+        """
+        Memory-map a vocabulary written by `compile`. Words and letter
+        bitsets are read from the mapping only when they are used.
+        """
+        with open(filename, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, width, letter_count, length_count = (
+            Vocabulary.HEADER.unpack_from(self.buffer)
+        )
+        if magic != Vocabulary.MAGIC or version != Vocabulary.FORMAT_VERSION:
+            raise ValueError(
+                f"{filename} is not a version {Vocabulary.FORMAT_VERSION} "
+                "compiled vocabulary"
+            )
+        encoding = "latin-1" if width == 1 else "utf-32-le"
+        offset = Vocabulary.HEADER.size
+        self.letters = list(
+            self.buffer[offset:offset + letter_count * width].decode(encoding)
+        )
+        offset += letter_count * width
+
+        self.words_by_length = dict()
+        bitmaps = dict()
+        for _ in range(length_count):
+            length, count, words_offset, bits_offset = (
+                Vocabulary.LENGTH_ENTRY.unpack_from(self.buffer, offset)
+            )
+            offset += Vocabulary.LENGTH_ENTRY.size
+            self.words_by_length[length] = WordArray(
+                self.buffer, words_offset, count, length * width, encoding
+            )
+            size = count // 8 + 1
+            for position in range(length):
+                for letter in self.letters:
+                    bitmaps[length, position, letter] = (
+                        bits_offset, bits_offset + size
+                    )
+                    bits_offset += size
+        self.letter_bits = LetterBitmaps(self.buffer, bitmaps)
+
+    def word_id(self, word):
+        """Return the id of `word` among words of its length, or None."""
+        words = self.words_by_length.get(len(word), ())
+        k = bisect.bisect_left(words, word)
+        if k < len(words) and words[k] == word:
+            return k
+        return None
+
+    def all_words(self, length):
+        """Return bitset of every word of the given length."""
+        return (1 << len(self.words_by_length.get(length, ()))) - 1
+
+    def domain_words(self, length, bits):
+        """Yield the words of the given length whose bits are set."""
+        words = self.words_by_length.get(length, ())
+        binary = bin(bits)[:1:-1]
+        k = binary.find("1")
+        while k != -1:
+            yield words[k]
+            k = binary.find("1", k + 1)
+
+
+class WordArray(collections.abc.Sequence):
+
+    def __init__(self, buffer, offset, count, size, encoding):
+        """Sorted fixed-width words of one length in a compiled vocabulary."""
+        self.buffer = buffer
+        self.offset = offset
+        self.count = count
+        self.size = size
+        self.encoding = encoding
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, k):
+        if not 0 <= k < self.count:
+            raise IndexError(k)
+        start = self.offset + k * self.size
+        return self.buffer[start:start + self.size].decode(self.encoding)
+
+
+class LetterBitmaps(dict):
+
+    def __init__(self, buffer, offsets):
+        """
+        Positional letter bitsets of a compiled vocabulary, converted from
+        the mapped bitmap at `offsets[key]` the first time `key` is used.
+        """
+        super().__init__()
+        self.buffer = buffer
+        self.offsets = offsets
+
+    def __missing__(self, key):
+        start, end = self.offsets[key]
+        bits = int.from_bytes(self.buffer[start:end], "little")
+        self[key] = bits
+        return bits
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
 class Crossword():
 
     def __init__(self, structure_file, words_file):
@@ -57,9 +307,14 @@ class Crossword():
                         row.append(False)
                 self.structure.append(row)
 
-        # Save vocabulary list
-        with open(words_file) as f:
-            self.words = set(f.read().upper().splitlines())
+        # Save vocabulary list, unless given one already loaded
+        if not isinstance(words_file, Vocabulary):
+            words_file = Vocabulary(words_file)
+        self.vocabulary = words_file
+        self.words = self.vocabulary
+        self.words_by_length = self.vocabulary.words_by_length
+        self.letters = self.vocabulary.letters
+        self.letter_bits = self.vocabulary.letter_bits
 
         # Determine variable set
         self.variables = set()
@@ -108,26 +363,54 @@ class Crossword():
         # For any pair of variables v1, v2, their overlap is either:
         #    None, if the two variables do not overlap; or
         #    (i, j), where v1's ith character overlaps v2's jth character
-        self.overlaps = dict()
-        for v1 in self.variables:
-            for v2 in self.variables:
-                if v1 == v2:
-                    continue
-                cells1 = v1.cells
-                cells2 = v2.cells
-                intersection = set(cells1).intersection(cells2)
-                if not intersection:
-                    self.overlaps[v1, v2] = None
-                else:
-                    intersection = intersection.pop()
-                    self.overlaps[v1, v2] = (
-                        cells1.index(intersection),
-                        cells2.index(intersection)
-                    )
+        # Only real crossings are stored, found by indexing the slots that
+        # pass through each cell; other pairs are None via `Overlaps`.
+        slots = dict()
+        for var in self.variables:
+            for k, cell in enumerate(var.cells):
+                slots.setdefault(cell, []).append((var, k))
+        self.overlaps = Overlaps()
+        adjacency = {var: set() for var in self.variables}
+        for crossing in slots.values():
+            for v1, k1 in crossing:
+                for v2, k2 in crossing:
+                    if v1 != v2:
+                        self.overlaps[v1, v2] = (k1, k2)
+                        adjacency[v1].add(v2)
+        self.adjacency = {
+            var: frozenset(neighbors) for var, neighbors in adjacency.items()
+        }
+
+    def __getstate__(self):
+        # The vocabulary aliases may be memory-mapped, so only the
+        # vocabulary itself is pickled (by path, if compiled)
+        state = self.__dict__.copy()
+        for alias in ["words", "words_by_length", "letters", "letter_bits"]:
+            del state[alias]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.words = self.vocabulary
+        self.words_by_length = self.vocabulary.words_by_length
+        self.letters = self.vocabulary.letters
+        self.letter_bits = self.vocabulary.letter_bits
+
+    def all_words(self, length):
+        """Return bitset of every word of the given length."""
+        return self.vocabulary.all_words(length)
+
+    def domain_words(self, length, bits):
+        """Yield the words of the given length whose bits are set."""
+        return self.vocabulary.domain_words(length, bits)
 
     def neighbors(self, var):
         """Given a variable, return set of overlapping variables."""
-        return set(
-            v for v in self.variables
-            if v != var and self.overlaps[v, var]
-        )
+        return self.adjacency[var]
+
+
+class Overlaps(dict):
+
+    def __missing__(self, key):
+        """Pairs of variables that do not cross have no overlap."""
+        return None
@@ -1,21 +1,81 @@
+import heapq
+import multiprocessing
+import random
 import sys
-import itertools
-import operator
+from collections import Counter, deque
 
 from crossword import *
 
+# Domains at least this large are ranked with NumPy, if installed
+NUMPY_DOMAIN_SIZE = 4096
+
 
 class CrosswordCreator():
 
-    def __init__(self, crossword):
+    def __init__(self, crossword, inference="mac", heuristic="degree",
+                 seed=None, node_limit=None):
         """
         Create new CSP crossword generate.
+
+        `inference` selects what happens after each assignment during
+        search: None only checks consistency, "forward" revises the
+        neighbors of the assigned variable, and "mac" maintains full
+        arc consistency from there.
+
+        `heuristic` selects the next variable to assign: "mrv" by minimum
+        remaining values only, "degree" by MRV with ties broken by degree,
+        and "domwdeg" by domain size over the weighted degree of the
+        variable, where a constraint gains weight each time it wipes out
+        a domain.
+
+        If `seed` is given, ties between variables and between values are
+        broken at random. If `node_limit` is given, search gives up (and
+        `solve` returns None) after trying that many values.
         """
+        if inference not in (None, "forward", "mac"):
+            raise ValueError(f"Unknown inference mode: {inference}")
+        if heuristic not in ("mrv", "degree", "domwdeg"):
+            raise ValueError(f"Unknown heuristic: {heuristic}")
         self.crossword = crossword
+        self.inference = inference
+        self.heuristic = heuristic
+        self.random = random.Random(seed) if seed is not None else None
+        self.node_limit = node_limit
         self.domains = {
-            var: self.crossword.words.copy()
+            var: self.crossword.all_words(var.length)
+            for var in self.crossword.variables
+        }
+
+        # Variables sharing a length may not repeat each other's words
+        self.same_length = dict()
+        for var in self.crossword.variables:
+            self.same_length.setdefault(var.length, []).append(var)
+
+        # Domains replaced during search, as (variable, old domain) pairs
+        self.trail = []
+
+        # Words used by the assignment under construction in `backtrack`
+        self.used_words = set()
+
+        # Static degrees and conflict-weighted degrees for variable ordering
+        self.degree = {
+            var: len(self.crossword.neighbors(var))
             for var in self.crossword.variables
         }
+        self.wdeg = self.degree.copy()
+        ranked = sorted(
+            self.crossword.variables, key=lambda v: (v.i, v.j, v.direction)
+        )
+        if self.random:
+            self.random.shuffle(ranked)
+        self.rank = {var: k for k, var in enumerate(ranked)}
+
+        # Priority heap of (key, rank, variable), updated lazily as domains
+        # change; None until `select_unassigned_variable` first builds it
+        self.heap = None
+
+        # Search and propagation counters
+        self.stats = Counter()
 
     def letter_grid(self, assignment):
         """
@@ -33,59 +93,35 @@ class CrosswordCreator():
                 letters[i][j] = word[k]
         return letters
 
-    def print(self, assignment):
+    def print(self, assignment, file=None):
         """
-        Print crossword assignment to the terminal.
+        Print crossword assignment to the terminal, or to `file`.
         """
         letters = self.letter_grid(assignment)
         for i in range(self.crossword.height):
             for j in range(self.crossword.width):
                 if self.crossword.structure[i][j]:
-                    print(letters[i][j] or " ", end="")
+                    print(letters[i][j] or " ", end="", file=file)
                 else:
-                    print("█", end="")
-            print()
+                    print("█", end="", file=file)
+            print(file=file)
 
-    def save(self, assignment, filename):
+    def save(self, assignment, filename, cell_size=100):
         """
-        Save crossword assignment to an image file.
+        Save crossword assignment to an image file, or to an SVG file if
+        `filename` ends in ".svg".
         """
-        from PIL import Image, ImageDraw, ImageFont
-        cell_size = 100
-        cell_border = 2
-        interior_size = cell_size - 2 * cell_border
-        letters = self.letter_grid(assignment)
-
-        # Create a blank canvas
-        img = Image.new(
-            "RGBA",
-            (self.crossword.width * cell_size,
-             self.crossword.height * cell_size),
-            "black"
+        from render import save_grid
+        save_grid(
+            self.crossword.structure, self.letter_grid(assignment),
+            filename, cell_size
         )
-        font = ImageFont.truetype("assets/fonts/OpenSans-Regular.ttf", 80)
-        draw = ImageDraw.Draw(img)
-
-        for i in range(self.crossword.height):
-            for j in range(self.crossword.width):
-
-                rect = [
-                    (j * cell_size + cell_border,
-                     i * cell_size + cell_border),
-                    ((j + 1) * cell_size - cell_border,
-                     (i + 1) * cell_size - cell_border)
-                ]
-                if self.crossword.structure[i][j]:
-                    draw.rectangle(rect, fill="white")
-                    if letters[i][j]:
-                        w, h = draw.textsize(letters[i][j], font=font)
-                        draw.text(
-                            (rect[0][0] + ((interior_size - w) / 2),
-                             rect[0][1] + ((interior_size - h) / 2) - 10),
-                            letters[i][j], fill="black", font=font
-                        )
 
-        img.save(filename)
+    def domain_words(self, var):
+        """
+        Return list of the words still in the domain of `var`.
+        """
+        return list(self.crossword.domain_words(var.length, self.domains[var]))
 
     def solve(self):
         """
@@ -93,6 +129,8 @@ class CrosswordCreator():
         """
         self.enforce_node_consistency()
         self.ac3()
+        self.used_words = set()
+        self.heap = None
         return self.backtrack(dict())
 
     def enforce_node_consistency(self):
@@ -102,9 +140,7 @@ class CrosswordCreator():
          constraints; in this case, the length of the word.)
         """
         for v in self.domains:
-            for word in self.domains[v].copy():
-                if len(word) != v.length:
-                    self.domains[v].remove(word)
+            self.domains[v] &= self.crossword.all_words(v.length)
 
     def revise(self, x, y):
         """
@@ -115,22 +151,28 @@ class CrosswordCreator():
         Return True if a revision was made to the domain of `x`; return
         False if no revision was made.
         """
-        changes = 0
-
-        if self.crossword.overlaps[(x,y)]:
-            cross = list(self.crossword.overlaps[(x,y)])
-            XletterNum = cross[0]
-            YletterNum = cross[1]
-            letters=[]
-            for Yword in self.domains[y]:
-                letters.append((list(Yword))[YletterNum])
-            for Xword in self.domains[x].copy():
-                    if all(list(Xword)[XletterNum] != letter for letter in letters):
-                        if Xword in self.domains[x]:
-                            self.domains[x].remove(Xword)
-                        changes+=1
-        if changes == 0:
+        self.stats["revise_calls"] += 1
+        overlap = self.crossword.overlaps[x, y]
+        if not overlap:
             return False
+        i, j = overlap
+        letter_bits = self.crossword.letter_bits
+
+        # Keep words of `x` whose letter at `i` appears at `j` in `y`
+        supported = 0
+        for letter in self.crossword.letters:
+            if self.domains[y] & letter_bits.get((y.length, j, letter), 0):
+                supported |= letter_bits.get((x.length, i, letter), 0)
+
+        revised = self.domains[x] & supported
+        if revised == self.domains[x]:
+            return False
+        if not revised and self.heuristic == "domwdeg":
+            self.wdeg[x] += 1
+            self.wdeg[y] += 1
+            self.push_variable(y)
+        self.restrict(x, revised)
+        self.stats["revisions"] += 1
         return True
 
     def ac3(self, arcs=None):
@@ -141,14 +183,82 @@ class CrosswordCreator():
 
         Return True if arc consistency is enforced and no domains are empty;
         return False if one or more domains end up empty.
+
+        Only arcs between overlapping variables are considered; whenever
+        the domain of `x` shrinks, every arc (z, x) is queued again.
         """
-        queue = list(itertools.combinations(self.crossword.variables, 2))
+        if arcs is None:
+            arcs = [
+                (x, y)
+                for x in self.crossword.variables
+                for y in self.crossword.neighbors(x)
+            ]
+        queue = deque(arcs)
+        queued = set(queue)
         while queue:
-            arc = queue[0]
-            if self.revise(arc[0], arc[1]):
-                if len(self.domains[arc[0]]) == 0:
+            x, y = queue.popleft()
+            queued.discard((x, y))
+            self.stats["arcs"] += 1
+            if self.revise(x, y):
+                if not self.domains[x]:
                     return False
-            queue.remove(arc)
+                for z in self.crossword.neighbors(x):
+                    if z != y and (z, x) not in queued:
+                        queue.append((z, x))
+                        queued.add((z, x))
+        return True
+
+    def restrict(self, var, bits):
+        """
+        Replace the domain of `var` with `bits`, recording the old domain
+        on the trail so that it can be restored by `undo`.
+        """
+        self.trail.append((var, self.domains[var]))
+        self.domains[var] = bits
+        self.push_variable(var)
+
+    def undo(self, mark):
+        """
+        Restore every domain changed since the trail had length `mark`.
+        """
+        while len(self.trail) > mark:
+            var, bits = self.trail.pop()
+            self.domains[var] = bits
+            self.push_variable(var)
+
+    def infer(self, var, value, assignment):
+        """
+        Propagate the assignment of `value` to `var` into the domains of
+        the other variables, according to `self.inference`.
+
+        Return False if some domain is wiped out; return True otherwise.
+        """
+        bit = 1 << self.crossword.vocabulary.word_id(value)
+        self.restrict(var, bit)
+        arcs = [
+            (neighbor, var)
+            for neighbor in self.crossword.neighbors(var)
+            if neighbor not in assignment
+        ]
+
+        # No other variable may use the same word
+        for other in self.same_length[var.length]:
+            if other in assignment or not self.domains[other] & bit:
+                continue
+            self.restrict(other, self.domains[other] & ~bit)
+            if not self.domains[other]:
+                return False
+            if self.inference == "mac":
+                arcs.extend(
+                    (neighbor, other)
+                    for neighbor in self.crossword.neighbors(other)
+                )
+
+        if self.inference == "mac":
+            return self.ac3(arcs)
+        for x, y in arcs:
+            if self.revise(x, y) and not self.domains[x]:
+                return False
         return True
 
     def assignment_complete(self, assignment):
@@ -166,24 +276,40 @@ class CrosswordCreator():
         Return True if `assignment` is consistent (i.e., words fit in crossword
         puzzle without conflicting characters); return False otherwise.
         """
-        if len(assignment)>1:
-            for v1 in assignment:
-                for v2 in assignment:
-                    if v1 != v2:
-                        cross = self.crossword.overlaps[(v1,v2)]
-                        if cross:
-                            if v1.direction == 'ACROSS' and v2.direction == 'DOWN':
-                                v1numLetter = cross[1]
-                                v2numLetter = cross[0]
-                            else:
-                                v1numLetter = cross[0]
-                                v2numLetter = cross[1]
-                            if list(assignment[v1])[v1numLetter] != list(assignment[v2])[v2numLetter]:
-                                return False
-                        if assignment[v1] == assignment[v2]:
-                            return False
+        words = set()
+        for var, word in assignment.items():
+            self.stats["constraint_checks"] += 1
+            if word in words:
+                return False
+            words.add(word)
+            for neighbor in self.crossword.neighbors(var):
+                if neighbor not in assignment:
+                    continue
+                self.stats["constraint_checks"] += 1
+                i, j = self.crossword.overlaps[var, neighbor]
+                if word[i] != assignment[neighbor][j]:
+                    return False
         return True
 
+    def consistent_with(self, var, assignment):
+        """
+        Return True if the word just assigned to `var` in `assignment` is
+        consistent with the rest of an assignment already known to be
+        consistent: it must not be in `self.used_words` and must agree with
+        every assigned neighbor at their crossing. Return False otherwise.
+        """
+        word = assignment[var]
+        self.stats["constraint_checks"] += 1
+        if word in self.used_words:
+            return False
+        for neighbor in self.crossword.neighbors(var):
+            if neighbor not in assignment:
+                continue
+            self.stats["constraint_checks"] += 1
+            i, j = self.crossword.overlaps[var, neighbor]
+            if word[i] != assignment[neighbor][j]:
+                return False
+        return True
 
     def order_domain_values(self, var, assignment):
         """
@@ -191,31 +317,72 @@ class CrosswordCreator():
         the number of values they rule out for neighboring variables.
         The first value in the list, for example, should be the one
         that rules out the fewest values among the neighbors of `var`.
+
+        Each unassigned neighbor contributes a histogram of the letters
+        its remaining words have at the crossing, so a value rules out
+        every word of that neighbor except those counted under its own
+        letter. Large domains are ranked with NumPy when it is available.
+        """
+        words = self.domain_words(var)
+        if self.random:
+            self.random.shuffle(words)
+        crossings = []
+        for neighbor in self.crossword.neighbors(var):
+            if neighbor in assignment:
+                continue
+            i, j = self.crossword.overlaps[var, neighbor]
+            crossings.append((
+                i,
+                popcount(self.domains[neighbor]),
+                self.letter_histogram(neighbor, j)
+            ))
+
+        if len(words) >= NUMPY_DOMAIN_SIZE:
+            try:
+                return self.order_with_numpy(var, words, crossings)
+            except ImportError:
+                pass
+
+        def eliminated(word):
+            return sum(
+                size - histogram.get(word[i], 0)
+                for i, size, histogram in crossings
+            )
+        return sorted(words, key=eliminated)
+
+    def letter_histogram(self, var, position):
+        """
+        Return dict mapping each letter to the number of words in the
+        domain of `var` with that letter at `position`.
+        """
+        histogram = dict()
+        domain = self.domains[var]
+        for letter in self.crossword.letters:
+            bits = self.crossword.letter_bits.get((var.length, position, letter))
+            if bits:
+                count = popcount(domain & bits)
+                if count:
+                    histogram[letter] = count
+        return histogram
+
+    def order_with_numpy(self, var, words, crossings):
+        """
+        Rank `words` (the domain of `var`) by the number of values they
+        rule out, as `order_domain_values` does, with a NumPy argsort.
         """
-        not_assigned = []
-        for var2 in self.crossword.variables:
-            if var2 not in assignment:
-                not_assigned.append(var2)
-
-        values_dict = dict()
-        for value in self.domains[var]:
-            for var2 in not_assigned:
-                eliminate=0
-                if var != var2:
-                    cross = self.crossword.overlaps[(var,var2)]
-                    if cross:
-                        if var.direction == 'ACROSS' and var2.direction == 'DOWN':
-                            v1numLetter = cross[1]
-                            v2numLetter = cross[0]
-                        else:
-                            v1numLetter = cross[0]
-                            v2numLetter = cross[1]
-                        for var2word in self.domains[var2]:
-                            if list(value)[v1numLetter] != list(var2word)[v2numLetter]:
-                                eliminate+=1
-            values_dict.update({value: eliminate})
-        sorted_dict = dict(sorted(values_dict.items(), key = operator.itemgetter(1)))
-        return sorted_dict.keys()
+        import numpy as np
+
+        codes = np.array(words, dtype=f"U{var.length}").view(np.uint32)
+        codes = codes.reshape(len(words), var.length)
+        letters = np.array([ord(c) for c in self.crossword.letters], np.uint32)
+        eliminated = np.zeros(len(words), dtype=np.int64)
+        for i, size, histogram in crossings:
+            counts = np.array(
+                [histogram.get(c, 0) for c in self.crossword.letters],
+                dtype=np.int64
+            )
+            eliminated += size - counts[np.searchsorted(letters, codes[:, i])]
+        return [words[k] for k in np.argsort(eliminated, kind="stable")]
 
     def select_unassigned_variable(self, assignment):
         """
@@ -224,15 +391,43 @@ class CrosswordCreator():
         in its domain. If there is a tie, choose the variable with the highest
         degree. If there is a tie, any of the tied variables are acceptable
         return values.
+
+        The choice comes from `self.heap`, which holds an up-to-date entry
+        for every unassigned variable: entries are pushed whenever a domain
+        or weight changes, and stale ones are discarded here on pop.
         """
-        var_dict = dict()
-        for var in self.crossword.variables:
-            if var not in assignment:
-                domains = self.domains[var]
-                var_dict.update({var:len(domains)})
-        if var_dict:
-            return min(var_dict, key=var_dict.get)
-        return False
+        if self.heap is None or len(self.heap) > 8 * len(self.rank):
+            self.heap = []
+            for var in self.crossword.variables:
+                if var not in assignment:
+                    self.push_variable(var)
+
+        while self.heap:
+            key, _, var = self.heap[0]
+            if var not in assignment and key == self.variable_key(var):
+                return var
+            heapq.heappop(self.heap)
+        return None
+
+    def variable_key(self, var):
+        """
+        Return the heap key of `var` under `self.heuristic`.
+        """
+        size = popcount(self.domains[var])
+        if self.heuristic == "mrv":
+            return (size,)
+        if self.heuristic == "domwdeg":
+            return (size / max(self.wdeg[var], 1), -self.degree[var])
+        return (size, -self.degree[var])
+
+    def push_variable(self, var):
+        """
+        Push the current key of `var` onto the variable heap, if built.
+        """
+        if self.heap is not None:
+            heapq.heappush(
+                self.heap, (self.variable_key(var), self.rank[var], var)
+            )
 
     def backtrack(self, assignment):
         """
@@ -242,41 +437,151 @@ class CrosswordCreator():
         `assignment` is a mapping from variables (keys) to words (values).
 
         If no assignment is possible, return None.
+
+        With inference enabled, every value tried has already been made
+        consistent with the assignment by propagation, and domain changes
+        are undone through the trail when the value is abandoned.
         """
         if self.assignment_complete(assignment):
             return assignment
-        else:
-            var = self.select_unassigned_variable(assignment)
-            if not var:
-                var = list(self.crossword.variables)[0]
-
-            for value in self.order_domain_values(var, assignment):
-                assignment.update({var: value})
-
-                if self.consistent(assignment):
-                    result = self.backtrack(assignment)
-                    if result != 'failure':
-                        return result
+
+        var = self.select_unassigned_variable(assignment)
+        for value in self.order_domain_values(var, assignment):
+            if self.out_of_nodes():
+                break
+            self.stats["nodes"] += 1
+            assignment[var] = value
+            mark = len(self.trail)
+            if self.inference is None:
+                ok = self.consistent_with(var, assignment)
+            else:
+                ok = self.infer(var, value, assignment)
+            if ok:
+                self.used_words.add(value)
+                result = self.backtrack(assignment)
+                if result is not None:
+                    return result
+                self.used_words.discard(value)
+            self.undo(mark)
             del assignment[var]
-            return 'failure'
+        self.stats["backtracks"] += 1
+        self.push_variable(var)
+        return None
+
+    def out_of_nodes(self):
+        """
+        Return True if search has tried `self.node_limit` values.
+        """
+        return (
+            self.node_limit is not None
+            and self.stats["nodes"] >= self.node_limit
+        )
 
 
+# Search configurations raced by `solve_portfolio`, one per worker in turn.
+# Entries with a "restarts" node limit run randomized restarts from a
+# per-worker seed, growing the limit by half after each restart. Entries
+# without run one complete search, seeded unless it is the first use of
+# the entry, so that repeated entries do not repeat the same search.
+PORTFOLIO = [
+    {"heuristic": "degree"},
+    {"heuristic": "domwdeg", "restarts": 1000},
+    {"heuristic": "mrv"},
+    {"heuristic": "degree", "restarts": 1000},
+    {"heuristic": "domwdeg"},
+    {"heuristic": "mrv", "restarts": 1000},
+]
+
+# Crossword shared by portfolio workers, set by `init_worker`
+worker_crossword = None
+
+
+def init_worker(crossword):
+    """
+    Store the preprocessed crossword for use by `portfolio_worker`.
+    """
+    global worker_crossword
+    worker_crossword = crossword
+
+
+def portfolio_worker(job):
+    """
+    Solve `worker_crossword` with the configuration of one portfolio job,
+    given as (seed, config). Return (assignment, config), where the
+    assignment is None if the search proved there is no solution.
+    """
+    seed, config = job
+    limit = config.get("restarts")
+    randomized = limit or seed >= len(PORTFOLIO)
+    while True:
+        creator = CrosswordCreator(
+            worker_crossword,
+            heuristic=config["heuristic"],
+            seed=seed if randomized else None,
+            node_limit=limit
+        )
+        assignment = creator.solve()
+        if assignment is not None or not creator.out_of_nodes():
+            return assignment, config
+        seed += 1_000_003
+        limit += limit // 2
+
+
+def solve_portfolio(crossword, workers):
+    """
+    Race `workers` processes, each searching `crossword` with a different
+    configuration from `PORTFOLIO` and seed. Return the first assignment
+    found, terminating the other workers, or None if there is no solution.
+    """
+    jobs = [
+        (seed, PORTFOLIO[seed % len(PORTFOLIO)])
+        for seed in range(workers)
+    ]
+    with multiprocessing.Pool(
+        workers, initializer=init_worker, initargs=(crossword,)
+    ) as pool:
+        for assignment, config in pool.imap_unordered(portfolio_worker, jobs):
+            if assignment is not None:
+                return assignment
+
+            # Any complete search without restarts proves unsatisfiability
+            if not config.get("restarts"):
+                return None
+    return None
+
 
 def main():
 
     # Check usage
-    if len(sys.argv) not in [3, 4]:
-        sys.exit("Usage: python generate.py structure words [output]")
+    args = sys.argv[1:]
+    workers = None
+    if "--portfolio" in args:
+        k = args.index("--portfolio")
+        try:
+            workers = int(args[k + 1])
+        except (IndexError, ValueError):
+            workers = 0
+        if workers < 1:
+            sys.exit("--portfolio requires a positive number of workers")
+        del args[k:k + 2]
+    if len(args) not in [2, 3]:
+        sys.exit(
+            "Usage: python generate.py structure words [output] "
+            "[--portfolio N]"
+        )
 
     # Parse command-line arguments
-    structure = sys.argv[1]
-    words = sys.argv[2]
-    output = sys.argv[3] if len(sys.argv) == 4 else None
+    structure = args[0]
+    words = args[1]
+    output = args[2] if len(args) == 3 else None
 
     # Generate crossword
     crossword = Crossword(structure, words)
     creator = CrosswordCreator(crossword)
-    assignment = creator.solve()
+    if workers:
+        assignment = solve_portfolio(crossword, workers)
+    else:
+        assignment = creator.solve()
 
     # Print result
     if assignment is None:
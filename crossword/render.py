@@ -0,0 +1,144 @@
+import functools
+import multiprocessing
+import os
+from xml.sax.saxutils import escape
+
+FONT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "assets", "fonts", "OpenSans-Regular.ttf"
+)
+
+
+def save_grid(structure, letters, filename, cell_size=100):
+    """
+    Save a crossword to `filename`, as SVG if the name ends in ".svg" and
+    as a raster image (format chosen by PIL from the name) otherwise.
+
+    `structure` is the crossword's grid of open (True) and blocked (False)
+    cells, and `letters` is the matching grid of letters or None, as
+    returned by `CrosswordCreator.letter_grid`.
+    """
+    if filename.lower().endswith(".svg"):
+        with open(filename, "w") as f:
+            f.write(render_svg(structure, letters, cell_size))
+    else:
+        render_image(structure, letters, cell_size).save(filename)
+
+
+def save_many(jobs, workers=None):
+    """
+    Save many crosswords across a process pool. Each job is a tuple of
+    arguments for `save_grid`. Each worker builds its glyph atlases once
+    and reuses them for every crossword it renders.
+    """
+    with multiprocessing.Pool(workers) as pool:
+        for _ in pool.imap_unordered(save_job, jobs, chunksize=8):
+            pass
+
+
+def save_job(job):
+    """
+    Save one crossword given as a tuple of `save_grid` arguments.
+    """
+    save_grid(*job)
+
+
+def cell_geometry(cell_size):
+    """
+    Return (border, interior) sizes in pixels of a cell of `cell_size`.
+    """
+    border = max(1, cell_size // 50)
+    return border, cell_size - 2 * border
+
+
+@functools.lru_cache(maxsize=None)
+def glyph(letter, cell_size):
+    """
+    Return the glyph of `letter` for cells of `cell_size` as a NumPy alpha
+    mask the size of a cell's interior, with the letter centered on it.
+    Glyphs are rasterized once per letter and size, then served from
+    this cache.
+    """
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    _, interior = cell_geometry(cell_size)
+    font = font_at(int(cell_size * 0.8))
+    left, top, right, bottom = font.getbbox(letter)
+    mask = Image.new("L", (interior, interior), 0)
+    ImageDraw.Draw(mask).text(
+        ((interior - (right - left)) / 2 - left,
+         (interior - (bottom - top)) / 2 - top),
+        letter, fill=255, font=font
+    )
+    return np.asarray(mask)
+
+
+@functools.lru_cache(maxsize=None)
+def font_at(size):
+    """
+    Return the crossword font loaded at `size` points.
+    """
+    from PIL import ImageFont
+    return ImageFont.truetype(FONT, size)
+
+
+def render_image(structure, letters, cell_size=100):
+    """
+    Return a PIL image of a crossword, drawn on a NumPy canvas by filling
+    open cells and blitting cached glyphs onto them.
+    """
+    import numpy as np
+    from PIL import Image
+
+    height, width = len(structure), len(structure[0])
+    border, interior = cell_geometry(cell_size)
+    canvas = np.zeros((height * cell_size, width * cell_size), np.uint8)
+
+    for i in range(height):
+        for j in range(width):
+            if not structure[i][j]:
+                continue
+            y = i * cell_size + border
+            x = j * cell_size + border
+            cell = canvas[y:y + interior, x:x + interior]
+            cell[:] = 255
+            if letters[i][j]:
+                cell -= glyph(letters[i][j], cell_size)
+
+    return Image.fromarray(canvas, "L")
+
+
+def render_svg(structure, letters, cell_size=100):
+    """
+    Return an SVG document drawing a crossword.
+    """
+    height, width = len(structure), len(structure[0])
+    border, interior = cell_geometry(cell_size)
+    font_size = int(cell_size * 0.8)
+    lines = [
+        '<svg xmlns="http://www.w3.org/2000/svg" '
+        f'width="{width * cell_size}" height="{height * cell_size}">',
+        f'<rect width="{width * cell_size}" height="{height * cell_size}" '
+        'fill="black"/>',
+        f'<g font-family="Open Sans, sans-serif" font-size="{font_size}" '
+        'text-anchor="middle" dominant-baseline="central">'
+    ]
+    for i in range(height):
+        for j in range(width):
+            if not structure[i][j]:
+                continue
+            x = j * cell_size + border
+            y = i * cell_size + border
+            lines.append(
+                f'<rect x="{x}" y="{y}" width="{interior}" '
+                f'height="{interior}" fill="white"/>'
+            )
+            if letters[i][j]:
+                lines.append(
+                    f'<text x="{x + interior / 2}" y="{y + interior / 2}">'
+                    f'{escape(letters[i][j])}</text>'
+                )
+    lines.append("</g>")
+    lines.append("</svg>")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,107 @@
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from heredity import *
+
+# Families handed to a worker at a time
+CHUNKSIZE = 16
+
+# Probability tables and method shared by batch workers, set by
+# `init_batch_worker`
+worker_tables = None
+worker_method = None
+
+
+def main():
+
+    # Check usage
+    if len(sys.argv) not in [2, 3, 4]:
+        sys.exit(
+            f"Usage: python batch.py families [{'|'.join(METHODS)}] [workers]"
+        )
+
+    # Parse command-line arguments
+    families = sys.argv[1]
+    method = sys.argv[2] if len(sys.argv) >= 3 else "eliminate"
+    if method not in METHODS:
+        sys.exit(f"Unknown method: {method}")
+    workers = int(sys.argv[3]) if len(sys.argv) == 4 else os.cpu_count()
+
+    # Compile the probability tables once for every family, and print one
+    # JSON line per family as results arrive
+    tables = compile_tables()
+    start = time.perf_counter()
+    count = 0
+    with multiprocessing.Pool(
+        workers, initializer=init_batch_worker, initargs=(tables, method)
+    ) as pool:
+        lines = pool.imap_unordered(
+            infer_family, family_files(families), chunksize=CHUNKSIZE
+        )
+        for line in lines:
+            count += 1
+            print(line, flush=True)
+    print(f"{count} families in {time.perf_counter() - start:.3f}s",
+          file=sys.stderr)
+
+
+def family_files(families):
+    """
+    Yield paths of family files: every .csv file in directory `families`,
+    or else every file matching `families` as a glob pattern.
+    """
+    if os.path.isdir(families):
+        for filename in sorted(os.listdir(families)):
+            if filename.endswith(".csv"):
+                yield os.path.join(families, filename)
+        return
+    yield from sorted(glob.glob(families))
+
+
+def init_batch_worker(tables, method):
+    """
+    Store the shared probability tables and method for `infer_family`.
+    """
+    global worker_tables, worker_method
+    worker_tables = tables
+    worker_method = method
+
+
+def infer_family(path):
+    """
+    Compute the probabilities of the family in the file at `path`, and
+    return them as a line of JSON, along with the file, method and
+    seconds taken, and for sampling methods the standard errors and
+    number of samples. If the family cannot be handled, the line holds
+    the file and the error instead, so that one bad file does not stop
+    the batch.
+    """
+    start = time.perf_counter()
+    result = {"file": path, "method": worker_method}
+    try:
+        people = load_data(path)
+        if worker_method in SAMPLERS:
+            probabilities, errors, samples = sample_probabilities(
+                people, worker_method, tables=worker_tables
+            )
+            result["standard_errors"] = errors
+            result["samples"] = samples
+        else:
+            probabilities = {
+                "enumerate": enumerate_probabilities,
+                "stream": stream_probabilities,
+                "eliminate": eliminate_probabilities,
+            }[worker_method](people, worker_tables)
+    except Exception as e:
+        return json.dumps({"file": path, "error": f"{type(e).__name__}: {e}"})
+    result["probabilities"] = probabilities
+    result["seconds"] = time.perf_counter() - start
+    return json.dumps(result)
+
+
+if __name__ == "__main__":
+    main()
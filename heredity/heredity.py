@@ -1,7 +1,12 @@
 import csv
+import heapq
 import itertools
+import math
+import multiprocessing
+from collections import defaultdict
 from itertools import chain
 import sys
+import time
 import numpy as np
 
 PROBS = {
@@ -38,29 +43,89 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Ways of computing `probabilities`, selectable on the command line
+METHODS = ["enumerate", "stream", "eliminate", "weighting", "gibbs"]
+
+# Approximate methods, which also report standard errors
+SAMPLERS = ["weighting", "gibbs"]
+
+# Samples drawn by the approximate methods, chains (or likelihood
+# weighting samples) advanced together, and Gibbs sweeps discarded
+# before counting samples
+SAMPLES = 100000
+CHAINS = 1024
+BURN_IN = 100
+
+# Most factors multiplied by one call to np.einsum
+MAX_OPERANDS = 16
+
+# Gene assignments whose joint probabilities are computed together
+BATCH = 1 << 16
+
 
 def main():
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
+    if len(sys.argv) not in [2, 3, 4]:
+        sys.exit(
+            f"Usage: python heredity.py data.csv [{'|'.join(METHODS)}] "
+            "[workers]"
+        )
+    method = sys.argv[2] if len(sys.argv) >= 3 else "enumerate"
+    if method not in METHODS:
+        sys.exit(f"Unknown method: {method}")
+    workers = int(sys.argv[3]) if len(sys.argv) == 4 else 1
     people = load_data(sys.argv[1])
 
-    # Keep track of gene and trait probabilities for each person
-    probabilities = {
-        person: {
-            "gene": {
-                2: 0,
-                1: 0,
-                0: 0
-            },
-            "trait": {
-                True: 0,
-                False: 0
-            }
-        }
-        for person in people
-    }
+    start = time.perf_counter()
+    errors = None
+    if method in SAMPLERS:
+        probabilities, errors, samples = sample_probabilities(
+            people, method, workers=workers
+        )
+    else:
+        probabilities = {
+            "enumerate": enumerate_probabilities,
+            "stream": stream_probabilities,
+            "eliminate": eliminate_probabilities,
+        }[method](people)
+    seconds = time.perf_counter() - start
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                if errors is None:
+                    print(f"    {value}: {p:.4f}")
+                else:
+                    error = errors[person][field][value]
+                    print(f"    {value}: {p:.4f} ± {error:.4f}")
+    if errors is not None:
+        print(f"{samples} samples in {seconds:.2f}s "
+              f"({samples / seconds:.0f} samples/sec)")
+
+
+def enumerate_probabilities(people, tables=None):
+    """
+    Return gene and trait probabilities for each person by summing the
+    joint probability of every assignment of genes and traits that
+    agrees with the known traits.
+
+    For each set of people with the trait, the joint probabilities of
+    all gene assignments are computed in batches of `BATCH` with
+    `Family.log_joint`, and added up in log space relative to the
+    largest joint probability seen so far, so that they cannot all
+    underflow to 0. `tables` are as returned by `compile_tables`, and
+    compiled from `PROBS` if not given, as for every method.
+    """
+    family = Family(people, tables)
+    n = len(family.names)
+    gene_weights = np.zeros((n, 3))
+    trait_weights = np.zeros((n, 2))
+    shift = -np.inf
 
     # Loop over all sets of people who might have the trait
     names = set(people)
@@ -74,25 +139,572 @@ def main():
         )
         if fails_evidence:
             continue
+        _, traits = family.encode(set(), set(), have_trait)
+
+        # Loop over all gene assignments, a batch at a time
+        for genes in gene_assignments(n):
+            log_p = family.log_joint(genes, traits)
+            largest = log_p.max()
+            if largest > shift:
+                gene_weights *= np.exp(shift - largest)
+                trait_weights *= np.exp(shift - largest)
+                shift = largest
+            p = np.exp(log_p - shift)
+            for gene in range(3):
+                gene_weights[:, gene] += p @ (genes == gene)
+            trait_weights[traits.astype(bool), 1] += p.sum()
+            trait_weights[~traits.astype(bool), 0] += p.sum()
 
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+    probabilities = {
+        person: {
+            "gene": {
+                2: gene_weights[i, 2],
+                1: gene_weights[i, 1],
+                0: gene_weights[i, 0]
+            },
+            "trait": {
+                True: trait_weights[i, 1],
+                False: trait_weights[i, 0]
+            }
+        }
+        for i, person in enumerate(family.names)
+    }
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
+    return probabilities
 
-    # Print results
+
+def gene_assignments(n, batch=BATCH):
+    """
+    Yield every assignment of 0, 1 or 2 copies of the gene to `n` people
+    as rows of int8 arrays of at most `batch` rows, row r giving person
+    i `r // 3 ** i % 3` copies.
+    """
+    total = 3 ** n
+    powers = 3 ** np.arange(n, dtype=np.int64)
+    for start in range(0, total, batch):
+        rows = np.arange(start, min(start + batch, total), dtype=np.int64)
+        yield (rows[:, np.newaxis] // powers % 3).astype(np.int8)
+
+
+def stream_probabilities(people, tables=None):
+    """
+    Return gene and trait probabilities for each person, like
+    `enumerate_probabilities`, visiting assignments one at a time.
+
+    Known traits are fixed rather than enumerated, so assignments that
+    contradict them are never generated. The remaining assignments are
+    visited in reflected Gray code order, in which consecutive
+    assignments differ in one person's genes or trait, so only the
+    factors of that person (and of their children, for genes) are
+    recomputed. Likewise the joint probability accumulated while a
+    person keeps a value is only added to their marginals once the
+    value changes.
+    """
+    family = Family(people, tables)
+    n = len(family.names)
+    prior = family.prior.tolist()
+    inheritance = family.inheritance.tolist()
+    trait = family.trait.tolist()
+    parents = [None] * n
+    children = [[] for _ in range(n)]
+    for child, mother, father in zip(
+        family.children.tolist(), family.mothers.tolist(),
+        family.fathers.tolist()
+    ):
+        parents[child] = (mother, father)
+        children[mother].append(child)
+        children[father].append(child)
+
+    def term(i):
+        if parents[i] is None:
+            gene = prior[genes[i]]
+        else:
+            mother, father = parents[i]
+            gene = inheritance[genes[i]][genes[mother]][genes[father]]
+        return gene + trait[genes[i]][traits[i]]
+
+    # Digits of the Gray code: everyone's genes, people with the fewest
+    # children (the cheapest to change) first, then unknown traits
+    genes = [0] * n
+    traits = [0] * n
+    digits = [("gene", i, 3) for i in sorted(range(n), key=lambda i: len(children[i]))]
+    for i, name in enumerate(family.names):
+        if people[name]["trait"] is None:
+            digits.append(("trait", i, 2))
+        else:
+            traits[i] = int(people[name]["trait"])
+
+    # Joint probabilities are summed relative to the largest seen so far
+    terms = [term(i) for i in range(n)]
+    log_p = shift = math.fsum(terms)
+    total = 1
+    gene_weights = [[0, 0, 0] for _ in range(n)]
+    trait_weights = [[0, 0] for _ in range(n)]
+    gene_marks = [0] * n
+    trait_marks = [0] * n
+
+    for step, (j, value) in enumerate(gray_code([d[2] for d in digits]), 1):
+        kind, i, _ = digits[j]
+        if kind == "gene":
+            gene_weights[i][genes[i]] += total - gene_marks[i]
+            gene_marks[i] = total
+            genes[i] = value
+            changed = [i] + children[i]
+        else:
+            trait_weights[i][traits[i]] += total - trait_marks[i]
+            trait_marks[i] = total
+            traits[i] = value
+            changed = [i]
+        for k in changed:
+            new = term(k)
+            log_p += new - terms[k]
+            terms[k] = new
+
+        # Keep rounding errors from building up, at O(1) amortized cost
+        if step % n == 0:
+            log_p = math.fsum(terms)
+
+        if log_p > shift:
+            scale = math.exp(shift - log_p)
+            total *= scale
+            for i in range(n):
+                gene_marks[i] *= scale
+                trait_marks[i] *= scale
+                gene_weights[i] = [w * scale for w in gene_weights[i]]
+                trait_weights[i] = [w * scale for w in trait_weights[i]]
+            shift = log_p
+        total += math.exp(log_p - shift)
+
+    for i in range(n):
+        gene_weights[i][genes[i]] += total - gene_marks[i]
+        trait_weights[i][traits[i]] += total - trait_marks[i]
+    probabilities = {
+        person: {
+            "gene": {
+                2: gene_weights[i][2],
+                1: gene_weights[i][1],
+                0: gene_weights[i][0]
+            },
+            "trait": {
+                True: trait_weights[i][1],
+                False: trait_weights[i][0]
+            }
+        }
+        for i, person in enumerate(family.names)
+    }
+    normalize(probabilities)
+    return probabilities
+
+
+def gray_code(radices):
+    """
+    Yield the changes between consecutive tuples of the reflected mixed
+    radix Gray code over digits with `radices` (each at least 2),
+    starting from all zeros, as (digit, new value) pairs. Each step
+    changes a single digit by 1 (Knuth's Algorithm H, loopless).
+    """
+    n = len(radices)
+    values = [0] * n
+    directions = [1] * n
+    focus = list(range(n + 1))
+    while True:
+        j = focus[0]
+        focus[0] = 0
+        if j == n:
+            return
+        values[j] += directions[j]
+        yield j, values[j]
+        if values[j] in (0, radices[j] - 1):
+            directions[j] = -directions[j]
+            focus[j] = focus[j + 1]
+            focus[j + 1] = j + 1
+
+
+def eliminate_probabilities(people, tables=None):
+    """
+    Return gene and trait probabilities for each person, in the same form
+    as `enumerate_probabilities`, by variable elimination.
+
+    Only the number of copies of the gene of each person is a variable:
+    a person's trait depends on their genes alone, so a known trait is
+    a factor over the person's genes, and an unknown one is summed out
+    from the person's gene distribution at the end. This takes time
+    polynomial in the size of the family when its pedigree is tree-like.
+    """
+    tables = tables or compile_tables()
+    factors = gene_factors(people, tables)
+    beliefs = eliminate(factors, elimination_order(factors))
+    trait = tables["trait"]
+
+    probabilities = dict()
     for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+        variables, table = beliefs[person]
+        others = tuple(i for i, v in enumerate(variables) if v != person)
+        genes = table.sum(axis=others)
+        genes = genes / genes.sum()
+        if people[person]["trait"] is None:
+            has_trait = float(genes @ trait[:, 1])
+        else:
+            has_trait = float(people[person]["trait"])
+        probabilities[person] = {
+            "gene": {
+                2: float(genes[2]),
+                1: float(genes[1]),
+                0: float(genes[0])
+            },
+            "trait": {
+                True: has_trait,
+                False: 1 - has_trait
+            }
+        }
+    return probabilities
+
+
+def compile_tables():
+    """
+    Return the probability tables derived from `PROBS` that inference
+    works from, as a dict of arrays: "prior" by number of copies of the
+    gene, and "inheritance" and "trait" as from `inheritance_table` and
+    `trait_table`.
+    """
+    return {
+        "prior": np.array([PROBS["gene"][gene] for gene in range(3)]),
+        "inheritance": inheritance_table(),
+        "trait": trait_table(),
+    }
+
+
+def inheritance_table():
+    """
+    Return an array whose [child, mother, father] entry is the probability
+    that a child has `child` copies of the gene, given the number of
+    copies each parent has.
+
+    Each parent passes the gene on with probability `PROBS["mutation"]`,
+    0.5 or 1 - `PROBS["mutation"]` when they have 0, 1 or 2 copies.
+    """
+    mutation = PROBS["mutation"]
+    passes = np.array([mutation, 0.5, 1 - mutation])
+    mother = passes[:, np.newaxis]
+    father = passes[np.newaxis, :]
+    return np.stack([
+        (1 - mother) * (1 - father),
+        mother * (1 - father) + (1 - mother) * father,
+        mother * father
+    ])
+
+
+def trait_table():
+    """
+    Return an array whose [gene, trait] entry is the probability of
+    having the trait (1) or not (0) given `gene` copies of the gene.
+    """
+    return np.array([
+        [PROBS["trait"][gene][False], PROBS["trait"][gene][True]]
+        for gene in range(3)
+    ])
+
+
+def gene_factors(people, tables):
+    """
+    Return the factors of the network over people's gene counts, as
+    (variables, table) pairs where `table` has one axis of length 3 per
+    person named in `variables`. Raise ValueError if a parent is not
+    one of `people`.
+    """
+    prior = tables["prior"]
+    inheritance = tables["inheritance"]
+    trait = tables["trait"]
+
+    factors = []
+    for person in people.values():
+        if person["mother"]:
+            for parent in (person["mother"], person["father"]):
+                if parent not in people:
+                    raise ValueError(
+                        f"Parent of {person['name']} not in family: {parent}"
+                    )
+            factors.append((
+                (person["name"], person["mother"], person["father"]),
+                inheritance
+            ))
+        else:
+            factors.append(((person["name"],), prior))
+
+        # Known traits are evidence about the person's genes
+        if person["trait"] is not None:
+            factors.append(((person["name"],), trait[:, int(person["trait"])]))
+    return factors
+
+
+def elimination_order(factors):
+    """
+    Return every variable of `factors` in the order they should be
+    eliminated, choosing greedily the variable whose elimination adds
+    the fewest new edges between its neighbors (min-fill), then the one
+    with the fewest neighbors.
+    """
+    neighbors = defaultdict(set)
+    for variables, _ in factors:
+        for variable in variables:
+            neighbors[variable].update(variables)
+    for variable in neighbors:
+        neighbors[variable].discard(variable)
+
+    def cost(variable):
+        fill = sum(
+            1 for a, b in itertools.combinations(neighbors[variable], 2)
+            if b not in neighbors[a]
+        )
+        return fill, len(neighbors[variable])
+
+    # Costs only change around eliminated variables, so they are kept in
+    # a heap and pushed again when they change; stale entries are skipped
+    costs = {variable: cost(variable) for variable in neighbors}
+    heap = [(c, variable) for variable, c in costs.items()]
+    heapq.heapify(heap)
+    order = []
+    while heap:
+        c, variable = heapq.heappop(heap)
+        if variable not in costs or costs[variable] != c:
+            continue
+        del costs[variable]
+        order.append(variable)
+
+        for a, b in itertools.permutations(neighbors[variable], 2):
+            neighbors[a].add(b)
+        for neighbor in neighbors[variable]:
+            neighbors[neighbor].discard(variable)
+        affected = set(neighbors[variable])
+        for neighbor in neighbors[variable]:
+            affected.update(neighbors[neighbor])
+        for other in affected:
+            if other in costs:
+                costs[other] = cost(other)
+                heapq.heappush(heap, (costs[other], other))
+    return order
+
+
+def eliminate(factors, order):
+    """
+    Eliminate the variables of `factors` in `order`, and return a dict
+    mapping each variable to a (variables, table) factor proportional
+    to the joint distribution of the variables it was eliminated with.
+
+    Eliminating a variable multiplies the factors that mention it, along
+    with the messages from earlier eliminations, and sums it out into a
+    message for the next variable of its cluster to be eliminated. This
+    forms a tree of clusters, and sending messages back down the tree
+    gives every cluster its full distribution, so a single pass finds
+    everyone's distribution rather than one elimination per person.
+    """
+    position = {variable: i for i, variable in enumerate(order)}
+    mentions = defaultdict(list)
+    for factor in factors:
+        first = min(factor[0], key=position.get)
+        mentions[first].append(factor)
+
+    # Upward pass: eliminate variables in order
+    clusters = dict()
+    local = dict()
+    parent = dict()
+    children = defaultdict(list)
+    upward = dict()
+    for variable in order:
+        incoming = [upward[child] for child in children[variable]]
+        local[variable] = mentions[variable]
+        scope = scope_of(local[variable] + incoming)
+        clusters[variable] = scope
+        separator = [v for v in scope if v != variable]
+        upward[variable] = multiply(local[variable] + incoming, separator)
+        if separator:
+            parent[variable] = min(separator, key=position.get)
+            children[parent[variable]].append(variable)
+
+    # Downward pass: each cluster sends its children what it knows from
+    # everywhere but that child
+    downward = dict()
+    beliefs = dict()
+    for variable in reversed(order):
+        incoming = [upward[child] for child in children[variable]]
+        if variable in parent:
+            incoming.append(downward[variable])
+        beliefs[variable] = multiply(
+            local[variable] + incoming, clusters[variable]
+        )
+        for i, child in enumerate(children[variable]):
+            others = incoming[:i] + incoming[i + 1:]
+            downward[child] = multiply(
+                local[variable] + others, upward[child][0]
+            )
+    return beliefs
+
+
+def scope_of(factors):
+    """
+    Return the variables of `factors`, in order of first appearance.
+    """
+    return list(dict.fromkeys(
+        variable for variables, _ in factors for variable in variables
+    ))
+
+
+def multiply(factors, variables):
+    """
+    Return the product of `factors` with every variable not in
+    `variables` summed out, as a (variables, table) factor. The table is
+    rescaled so that its largest entry is 1, since only the relative
+    sizes of its entries matter, which keeps products over large
+    families from underflowing.
+    """
+    # np.einsum takes a limited number of operands, so long products
+    # are taken a chunk at a time
+    factors = list(factors)
+    while len(factors) > MAX_OPERANDS:
+        chunk = factors[:MAX_OPERANDS]
+        factors = factors[MAX_OPERANDS:] + [multiply(chunk, scope_of(chunk))]
+
+    # Variables no factor mentions are constant across the product
+    missing = set(variables).difference(scope_of(factors))
+    factors += [((variable,), np.ones(3)) for variable in missing]
+
+    labels = dict()
+    operands = []
+    for names, table in factors:
+        operands.append(table)
+        operands.append([labels.setdefault(name, len(labels)) for name in names])
+    table = np.einsum(*operands, [labels[name] for name in variables])
+    largest = table.max()
+    if largest > 0:
+        table = table / largest
+    return tuple(variables), table
+
+
+def sample_probabilities(people, method, n=SAMPLES, chains=CHAINS,
+                         workers=1, seed=None, tables=None):
+    """
+    Return estimates of the gene and trait probabilities for each
+    person, their standard errors in the same form, and the number of
+    samples the estimates are based on.
+
+    `method` "weighting" draws `n` samples by likelihood weighting,
+    `chains` at a time. `method` "gibbs" runs `chains` Gibbs chains side
+    by side for `BURN_IN` sweeps and then until `n` samples are taken.
+    With `workers` above 1, the samples and chains are split across a
+    process pool with independent random streams.
+
+    Likelihood weighting suits families with little evidence: with many
+    known traits a few samples carry most of the weight, and both its
+    estimates and their standard errors become unreliable.
+    """
+    family = Family(people, tables)
+    streams = np.random.SeedSequence(seed).spawn(workers)
+    jobs = [
+        (family, method, n // workers + (k < n % workers),
+         max(1, chains // workers), stream)
+        for k, stream in enumerate(streams)
+    ]
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(sampling_job, jobs)
+    else:
+        results = [sampling_job(jobs[0])]
+    samples = sum(result[-1] for result in results)
+
+    if method == "weighting":
+        # Each job's sums are relative to its largest log weight, so they
+        # are brought to the largest of all before being added up
+        shift = max(result[0] for result in results)
+        weight, weighted, square, squared = 0, 0, 0, 0
+        for job_shift, *sums, _ in results:
+            if job_shift == -np.inf:
+                continue
+            scale = np.exp(job_shift - shift)
+            weight += sums[0] * scale
+            weighted = weighted + sums[1] * scale
+            square += sums[2] * scale ** 2
+            squared = squared + sums[3] * scale ** 2
+        if not weight > 0:
+            raise ValueError("Every sample has zero weight given the evidence")
+
+        # Self-normalized importance sampling: the weighted mean of each
+        # indicator, with the delta method's standard error
+        estimates = weighted / weight
+        variance = (
+            squared - 2 * estimates * squared + estimates ** 2 * square
+        )
+        errors = np.sqrt(np.maximum(variance, 0)) / weight
+    else:
+        # Chains are independent, so the spread of their means gives the
+        # standard error whatever the correlation within each chain
+        means = np.concatenate([result[0] for result in results])
+        estimates = means.mean(axis=0)
+        errors = means.std(axis=0, ddof=1) / np.sqrt(len(means))
+
+    return (
+        family.marginals(estimates), family.marginals(errors), samples
+    )
+
+
+def sampling_job(job):
+    """
+    Draw the samples of one `sample_probabilities` job, given as (family,
+    method, n, chains, seed). For likelihood weighting, return the
+    largest log weight, followed by the sums of the weights, of the
+    weights times each indicator, and of their squares, with weights
+    taken relative to the largest so that they do not underflow; for
+    Gibbs sampling, the mean of each indicator per chain. Both end with
+    the number of samples taken.
+    """
+    family, method, n, chains, seed = job
+    rng = np.random.default_rng(seed)
+    size = (len(family.names), 5)
+
+    if method == "weighting":
+        shift = -np.inf
+        sums = [0, np.zeros(size), 0, np.zeros(size)]
+        for start in range(0, n, chains):
+            genes, traits, log_weights = family.forward_sample(
+                rng, min(chains, n - start)
+            )
+            largest = log_weights.max()
+            if largest > shift:
+                scale = np.exp(shift - largest)
+                sums = [
+                    sums[0] * scale, sums[1] * scale,
+                    sums[2] * scale ** 2, sums[3] * scale ** 2
+                ]
+                shift = largest
+            weights = np.exp(log_weights - shift)
+            indicators = family.indicators(genes, traits)
+            sums[0] += weights.sum()
+            sums[1] += np.tensordot(weights, indicators, axes=1)
+            sums[2] += (weights ** 2).sum()
+            sums[3] += np.tensordot(weights ** 2, indicators, axes=1)
+        return (shift, *sums, n)
+
+    genes, traits, _ = family.forward_sample(rng, chains)
+    sweeps = max(1, -(-n // chains))
+    means = np.zeros((chains,) + size)
+    for sweep in range(BURN_IN + sweeps):
+        family.gibbs_sweep(rng, genes, traits)
+        if sweep >= BURN_IN:
+            means += family.indicators(genes, traits)
+    return means / sweeps, sweeps * chains
+
+
+def categorical(rng, log_weights):
+    """
+    Return one sample per row of `log_weights`, a (K, V) array of log
+    weights (unnormalized) over V values.
+    """
+    cumulative = np.cumsum(
+        np.exp(log_weights - log_weights.max(axis=1, keepdims=True)), axis=1
+    )
+    u = rng.random(len(cumulative)) * cumulative[:, -1]
+    return (u[:, np.newaxis] >= cumulative[:, :-1]).sum(axis=1)
 
 
 def load_data(filename):
@@ -129,8 +741,203 @@ def powerset(s):
     ]
 
 
+class Family():
+
+    def __init__(self, people, tables=None):
+        """
+        Encode a family loaded by `load_data` for computing joint
+        probabilities from `tables` (see `compile_tables`). `names[i]`
+        is the i-th person, and `mothers[k]` and `fathers[k]` are the
+        indices of the parents of person `children[k]`; people in
+        `founders` have no parents.
+
+        `prior[g]`, `inheritance[g, m, f]` and `trait[g, t]` are the log
+        probabilities of `g` copies of the gene for someone without
+        parents, for a child of parents with `m` and `f` copies, and of
+        having the trait (t = 1) or not (t = 0) with `g` copies.
+        """
+        self.names = list(people)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.founders = np.array([
+            i for i, name in enumerate(self.names)
+            if not people[name]["mother"]
+        ], dtype=np.int64)
+        self.children = np.array([
+            i for i, name in enumerate(self.names)
+            if people[name]["mother"]
+        ], dtype=np.int64)
+        self.mothers = np.array([
+            self.index[people[self.names[i]]["mother"]] for i in self.children
+        ], dtype=np.int64)
+        self.fathers = np.array([
+            self.index[people[self.names[i]]["father"]] for i in self.children
+        ], dtype=np.int64)
+
+        # People whose trait is known, with their traits as `evidence`
+        self.known = np.array([
+            i for i, name in enumerate(self.names)
+            if people[name]["trait"] is not None
+        ], dtype=np.int64)
+        self.unknown = np.array([
+            i for i, name in enumerate(self.names)
+            if people[name]["trait"] is None
+        ], dtype=np.int64)
+        self.evidence = np.array([
+            int(people[self.names[i]]["trait"]) for i in self.known
+        ], dtype=np.int8)
+
+        # Each child's (mother, father), each person's (child, other
+        # parent) pairs for children where they are the mother and the
+        # father, and everyone with parents before their children
+        self.parents = dict(zip(
+            self.children.tolist(),
+            zip(self.mothers.tolist(), self.fathers.tolist())
+        ))
+        self.as_mother = defaultdict(list)
+        self.as_father = defaultdict(list)
+        for child, (mother, father) in self.parents.items():
+            self.as_mother[mother].append((child, father))
+            self.as_father[father].append((child, mother))
+        self.order = []
+        placed = set()
+        while len(self.order) < len(self.names):
+            ready = [
+                i for i in range(len(self.names))
+                if i not in placed
+                and placed.issuperset(self.parents.get(i, ()))
+            ]
+            if not ready:
+                raise ValueError("Family has a cycle of parents")
+            self.order.extend(ready)
+            placed.update(ready)
+
+        tables = tables or compile_tables()
+        self.prior = np.log(tables["prior"])
+        self.inheritance = np.log(tables["inheritance"])
+        self.trait = np.log(tables["trait"])
+
+    def encode(self, one_gene, two_genes, have_trait):
+        """
+        Return arrays of each person's number of copies of the gene and
+        whether they have the trait (1) or not (0), from sets of names.
+        """
+        genes = np.zeros(len(self.names), dtype=np.int8)
+        traits = np.zeros(len(self.names), dtype=np.int8)
+        genes[[self.index[name] for name in one_gene]] = 1
+        genes[[self.index[name] for name in two_genes]] = 2
+        traits[[self.index[name] for name in have_trait]] = 1
+        return genes, traits
+
+    def log_joint(self, genes, traits):
+        """
+        Return the log joint probability of the assignments of genes and
+        traits in the last axis of `genes` and `traits`, which may hold
+        a batch of assignments in their other axes and are broadcast
+        against each other.
+        """
+        genes, traits = np.broadcast_arrays(genes, traits)
+        log_p = self.trait[genes, traits]
+        log_p[..., self.founders] += self.prior[genes[..., self.founders]]
+        log_p[..., self.children] += self.inheritance[
+            genes[..., self.children],
+            genes[..., self.mothers],
+            genes[..., self.fathers]
+        ]
+        return log_p.sum(axis=-1)
+
+    def forward_sample(self, rng, k):
+        """
+        Draw `k` assignments by likelihood weighting: genes and unknown
+        traits are sampled from their distributions given the parents'
+        genes, parents first, and known traits are set to the evidence.
+        Return (K, N) arrays of genes and traits and each sample's log
+        weight, the log probability of the evidence given its genes.
+        """
+        genes = np.zeros((k, len(self.names)), dtype=np.int8)
+        for i in self.order:
+            if i in self.parents:
+                mother, father = self.parents[i]
+                log_p = self.inheritance[:, genes[:, mother], genes[:, father]]
+                genes[:, i] = categorical(rng, log_p.T)
+            else:
+                genes[:, i] = categorical(
+                    rng, np.broadcast_to(self.prior, (k, 3))
+                )
+
+        traits = self.sample_traits(rng, genes)
+        log_weights = self.trait[genes[:, self.known], self.evidence]
+        return genes, traits, log_weights.sum(axis=1)
+
+    def sample_traits(self, rng, genes):
+        """
+        Return traits sampled given `genes`, with known traits set to the
+        evidence.
+        """
+        has_trait = np.exp(self.trait[:, 1])[genes]
+        traits = (rng.random(genes.shape) < has_trait).astype(np.int8)
+        traits[:, self.known] = self.evidence
+        return traits
+
+    def gibbs_sweep(self, rng, genes, traits):
+        """
+        Advance K Gibbs chains, given as (K, N) arrays of genes and
+        traits, by one sweep in place: each person's genes are resampled
+        in turn given everyone else's genes and their own trait, then
+        unknown traits are resampled given the new genes.
+        """
+        values = np.arange(3)
+        for i in range(len(self.names)):
+            log_p = self.trait[values, traits[:, i, np.newaxis]]
+            if i in self.parents:
+                mother, father = self.parents[i]
+                log_p += self.inheritance[:, genes[:, mother], genes[:, father]].T
+            else:
+                log_p += self.prior
+            for child, father in self.as_mother[i]:
+                log_p += self.inheritance[
+                    genes[:, child, np.newaxis], values,
+                    genes[:, father, np.newaxis]
+                ]
+            for child, mother in self.as_father[i]:
+                log_p += self.inheritance[
+                    genes[:, child, np.newaxis],
+                    genes[:, mother, np.newaxis], values
+                ]
+            genes[:, i] = categorical(rng, log_p)
+        traits[:] = self.sample_traits(rng, genes)
+
+    def indicators(self, genes, traits):
+        """
+        Return a (K, N, 5) array of indicators of 0, 1 and 2 copies of
+        the gene and of not having and having the trait, per person.
+        """
+        return np.concatenate((
+            genes[..., np.newaxis] == np.arange(3),
+            traits[..., np.newaxis] == np.arange(2)
+        ), axis=-1).astype(np.float64)
+
+    def marginals(self, values):
+        """
+        Return an (N, 5) array laid out like `indicators` as a dict of
+        gene and trait distributions per person, like `probabilities`.
+        """
+        return {
+            name: {
+                "gene": {
+                    2: float(values[i, 2]),
+                    1: float(values[i, 1]),
+                    0: float(values[i, 0])
+                },
+                "trait": {
+                    True: float(values[i, 4]),
+                    False: float(values[i, 3])
+                }
+            }
+            for i, name in enumerate(self.names)
+        }
+
+
 def joint_probability(people, one_gene, two_genes, have_trait):
-    print (f'One gene:{one_gene}, Two gene:{two_genes}, Have:{have_trait}')
     """
     Compute and return a joint probability.
 
@@ -141,130 +948,10 @@ def joint_probability(people, one_gene, two_genes, have_trait):
         * everyone in set `have_trait` has the trait, and
         * everyone not in set` have_trait` does not have the trait.
     """
-    probs = []
-
-    for i in people.values():
-        if not i['mother']:
-            #Calculate 0 genes no trait with no parents
-            if i['name'] not in chain(one_gene,two_genes,have_trait):
-                gene_amount = 0
-                trait = False
-
-            #Calculate 0 genes have_trait with no parents
-            if i['name'] not in one_gene and i['name'] not in two_genes and i['name'] in have_trait:
-                gene_amount = 0
-                trait = True
-
-            #Calculate 1 gene no trait with no parents
-            elif i['name'] in one_gene and i['name'] not in have_trait:
-                gene_amount = 1
-                trait = False
-
-            #Calculate 1 gene have_trait with no parents
-            elif i['name'] in one_gene and i['name'] in have_trait:
-                gene_amount = 1
-                trait = True
-
-            #Calculate 2 genes no trait with no parents
-            elif i['name'] in two_genes and i['name'] not in have_trait:
-                gene_amount = 2
-                trait = False
-
-            #Calculate 2 genes have_trait with no parents
-            elif i['name'] in two_genes and i['name'] in have_trait:
-                gene_amount = 2
-                trait = True
-
-            # probs[i['name']] = {'gene_amount': gene_amount, 'gene_prob':PROBS['gene_amount'][gene_amount], 'trait_prob': PROBS['trait'][gene_amount][trait]}}
-            prob = PROBS['gene'][gene_amount] * PROBS['trait'][gene_amount][trait]
-            probs.append(prob)
-
-
-
-        if i['mother']:
-
-            # 0 genes
-            if i['name'] not in chain(one_gene,two_genes):
-                if i['mother'] not in chain(one_gene,two_genes) and i['father'] not in chain(one_gene,two_genes):
-                    prob_gene = 0.99*0.99
-                elif i['mother'] not in chain(one_gene,two_genes) and i['father'] in one_gene:
-                    prob_gene = 0.99*0.5
-                elif i['father'] not in chain(one_gene,two_genes) and i['mother'] in one_gene:
-                    prob_gene = 0.99*0.5
-                elif i['mother'] not in chain(one_gene,two_genes) and i['father'] in two_genes:
-                    prob_gene = 0.99*0.01
-                elif i['father'] not in chain(one_gene,two_genes) and i['mother'] in two_genes:
-                    prob_gene = 0.99*0.01
-                elif i['mother'] in one_gene and i['father'] in one_gene:
-                    prob_gene = 0.5*0.5
-                elif i['mother'] in one_gene and i['father'] in two_genes:
-                    prob_gene = 0.5*0.01
-                elif i['father'] in one_gene and i['mother'] in two_genes:
-                    prob_gene = 0.5*0.01
-                elif i['father'] in two_genes and i['mother'] in two_genes:
-                    prob_gene = 0.01*0.01
-
-                if i['name'] in have_trait:
-                    prob = prob_gene * PROBS['trait'][0][True]
-                else:
-                    prob = prob_gene * PROBS['trait'][0][False]
-                probs.append(prob)
-
-            # 1 gene
-            if i['name'] in one_gene:
-                if i['mother'] not in chain(one_gene,two_genes) and i['father'] not in chain(one_gene,two_genes):
-                    prob_gene = 0.01*0.99 + 0.01*0.99
-                elif i['mother'] not in chain(one_gene,two_genes) and i['father'] in one_gene:
-                    prob_gene = 0.5
-                elif i['father'] not in chain(one_gene,two_genes) and i['mother'] in one_gene:
-                    prob_gene = 0.5
-                elif i['mother'] not in chain(one_gene,two_genes) and i['father'] in two_genes:
-                    prob_gene = 0.01 * 0.01 + 0.99*0.99
-                elif i['father'] not in chain(one_gene,two_genes) and i['mother'] in two_genes:
-                    prob_gene = 0.01 * 0.01 + 0.99*0.99
-                elif i['mother'] in one_gene and i['father'] in one_gene:
-                    prob_gene = 0.5
-                elif i['mother'] in one_gene and i['father'] in two_genes:
-                    prob_gene = 0.5
-                elif i['father'] in one_gene and i['mother'] in two_genes:
-                    prob_gene = 0.5
-                elif i['father'] in two_genes and i['mother'] in two_genes:
-                    prob_gene = 0.01*0.99 + 0.99*0.01
-
-                if i['name'] in have_trait:
-                    prob = prob_gene * PROBS['trait'][1][True]
-                else:
-                    prob = prob_gene * PROBS['trait'][1][False]
-                probs.append(prob)
-
-            # 2 gene
-            if i['name'] in two_genes:
-                if i['mother'] not in chain(one_gene,two_genes) and i['father'] not in chain(one_gene,two_genes):
-                    prob_gene = 0.01*0.01
-                elif i['mother'] not in chain(one_gene,two_genes) and i['father'] in one_gene:
-                    prob_gene = 0.01*0.5
-                elif i['father'] not in chain(one_gene,two_genes) and i['mother'] in one_gene:
-                    prob_gene = 0.5*0.01
-                elif i['mother'] not in chain(one_gene,two_genes) and i['father'] in two_genes:
-                    prob_gene = 0.01 * 0.99
-                elif i['father'] not in chain(one_gene,two_genes) and i['mother'] in two_genes:
-                    prob_gene = 0.01 * 0.99
-                elif i['mother'] in one_gene and i['father'] in one_gene:
-                    prob_gene = 0.5*0.5
-                elif i['mother'] in one_gene and i['father'] in two_genes:
-                    prob_gene = 0.5*0.99
-                elif i['father'] in one_gene and i['mother'] in two_genes:
-                    prob_gene = 0.5*0.99
-                elif i['father'] in two_genes and i['mother'] in two_genes:
-                    prob_gene = 0.99*0.99
-
-                if i['name'] in have_trait:
-                    prob = prob_gene * PROBS['trait'][2][True]
-                else:
-                    prob = prob_gene * PROBS['trait'][2][False]
-                probs.append(prob)
+    family = Family(people)
+    genes, traits = family.encode(one_gene, two_genes, have_trait)
+    return float(np.exp(family.log_joint(genes, traits)))
 
-    return (np.prod(probs))
 
 def update(probabilities, one_gene, two_genes, have_trait, p):
     """
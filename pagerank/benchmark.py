@@ -0,0 +1,214 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from blocks import block_pagerank, partition
+from pagerank import *
+
+# Synthetic graph sizes, in pages
+SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+
+# Link structure of synthetic graphs: out-degrees and the popularity of
+# link targets both follow power laws with these exponents, and this
+# fraction of pages has no links at all
+OUT_EXPONENT = 2.1
+IN_EXPONENT = 1.8
+DANGLING = 0.1
+
+# Largest graphs written out as HTML and crawled, and run through the
+# original dict-based sampler and iteration (quadratic in pages)
+HTML_PAGES = 10 ** 4
+DICT_PAGES = 10 ** 3
+
+# Samples per page taken by the vectorized sampler
+SAMPLES_PER_PAGE = [1, 10, 100]
+
+# Tolerance of the reference ranks that errors are measured against
+REFERENCE_TOLERANCE = 1e-12
+
+SEED = 50
+
+
+def main():
+
+    # Check usage
+    args = sys.argv[1:]
+    memory = "--memory" in args
+    if memory:
+        args.remove("--memory")
+    if len(args) not in [1, 2]:
+        sys.exit(
+            "Usage: python benchmark.py output.json [max_pages] [--memory]"
+        )
+    max_pages = int(args[1]) if len(args) == 2 else max(SIZES)
+
+    results = []
+    rng = np.random.default_rng(SEED)
+    for size in SIZES:
+        if size > max_pages:
+            continue
+        with tempfile.TemporaryDirectory() as directory:
+            for result in benchmark(size, rng, directory, memory):
+                results.append(result)
+                line = (
+                    f"{result['pages']} pages {result['stage']} "
+                    f"{result['method']}: {result['seconds']:.3f}s"
+                )
+                if "peak_bytes" in result:
+                    line += f", {result['peak_bytes'] / 2 ** 20:.1f} MiB"
+                if "l1_error" in result:
+                    line += f", L1 error {result['l1_error']:.2e}"
+                print(line)
+
+    with open(args[0], "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def benchmark(size, rng, directory, memory=False):
+    """
+    Generate a graph of `size` pages and yield one result dict per timed
+    stage and method. Ranks are scored by their L1 error against power
+    iteration run to `REFERENCE_TOLERANCE`. With `memory`, each stage is
+    run a second time to measure its peak traced memory, except stages
+    run in a process pool, whose workers tracemalloc does not see.
+    """
+    pages = [f"{i}.html" for i in range(size)]
+    sources, targets = synthetic_graph(size, rng)
+    matrix = LinkMatrix.from_edges(pages, sources, targets)
+    reference, _ = power_iteration(
+        matrix, DAMPING, np.full(size, 1 / size), REFERENCE_TOLERANCE
+    )
+    reference = matrix.ranks(reference)
+    common = {"pages": size, "links": len(matrix.sources)}
+
+    def result(stage, method, function, *args, ranked=True, pool=False,
+               **extra):
+        value, seconds = timed(function, *args)
+        entry = dict(common, stage=stage, method=method, seconds=seconds,
+                     **extra)
+        if ranked:
+            entry["l1_error"] = l1_error(value, reference)
+        if memory and not pool:
+            entry["peak_bytes"] = peak_memory(function, *args)
+        return value, entry
+
+    # Crawling, from HTML files written for small graphs only
+    corpus = None
+    if size <= HTML_PAGES:
+        html = os.path.join(directory, "corpus")
+        write_corpus(html, matrix)
+        corpus, entry = result("crawl", "dict", crawl, html, ranked=False)
+        yield entry
+        _, entry = result("crawl", "sparse", crawl_links, html,
+                          ranked=False, pool=True)
+        yield entry
+
+    # Sampling
+    if corpus is not None and size <= DICT_PAGES:
+        _, entry = result("sample_pagerank", "dict", sample_pagerank,
+                          corpus, DAMPING, SAMPLES, samples=SAMPLES)
+        yield entry
+    for per_page in SAMPLES_PER_PAGE:
+        samples = per_page * size
+        _, entry = result("sample_pagerank", "sparse", sample_pagerank,
+                          matrix, DAMPING, samples, "sparse", samples=samples)
+        yield entry
+
+    # Iteration
+    if corpus is not None and size <= DICT_PAGES:
+        _, entry = result("iterate_pagerank", "dict", iterate_pagerank,
+                          corpus, DAMPING)
+        yield entry
+    def solve(method):
+        residuals = []
+        ranks = iterate_pagerank(matrix, DAMPING, method, residuals)
+        return ranks, len(residuals)
+
+    for method in SOLVERS:
+        (ranks, iterations), entry = result(
+            "iterate_pagerank", method, solve, method, ranked=False
+        )
+        entry["l1_error"] = l1_error(ranks, reference)
+        entry["iterations"] = iterations
+        yield entry
+    blocks = os.path.join(directory, "blocks")
+    partition(matrix, blocks)
+    _, entry = result("iterate_pagerank", "blocks", block_pagerank, blocks,
+                      DAMPING, pool=True)
+    yield entry
+
+
+def synthetic_graph(size, rng):
+    """
+    Return the source and target page ids of the links of a random graph
+    of `size` pages, without duplicate links or links from a page to
+    itself. Out-degrees follow a power law with exponent `OUT_EXPONENT`
+    and the pages linked to follow one with exponent `IN_EXPONENT`, so
+    that a few pages collect most links, like on the web.
+    """
+    degree = np.minimum(rng.zipf(OUT_EXPONENT, size), size - 1)
+    degree[rng.random(size) < DANGLING] = 0
+    sources = np.repeat(np.arange(size), degree)
+
+    # Popularity ranks are shuffled so that popular pages are spread out
+    popularity = rng.permutation(size)
+    targets = popularity[(rng.zipf(IN_EXPONENT, len(sources)) - 1) % size]
+
+    links = np.unique(sources.astype(np.int64) * size + targets)
+    sources, targets = np.divmod(links, size)
+    keep = sources != targets
+    return sources[keep], targets[keep]
+
+
+def write_corpus(directory, matrix):
+    """
+    Write `matrix` out as a directory of HTML pages for `crawl`.
+    """
+    os.makedirs(directory)
+    for j, page in enumerate(matrix.pages):
+        links = matrix.targets[matrix.out_indptr[j]:matrix.out_indptr[j + 1]]
+        with open(os.path.join(directory, page), "w") as f:
+            f.write("<!DOCTYPE html>\n<html>\n<body>\n")
+            for i in links:
+                f.write(f'<a href="{matrix.pages[i]}">{matrix.pages[i]}</a>\n')
+            f.write("</body>\n</html>\n")
+
+
+def timed(function, *args):
+    """
+    Call `function` with `args`, returning its result and wall time.
+    """
+    start = time.perf_counter()
+    value = function(*args)
+    return value, time.perf_counter() - start
+
+
+def peak_memory(function, *args):
+    """
+    Call `function` with `args` under tracemalloc and return its peak
+    traced memory in bytes. Tracing slows the call down several times,
+    so it is kept apart from the calls that are timed.
+    """
+    tracemalloc.start()
+    try:
+        function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def l1_error(ranks, reference):
+    """
+    Return the L1 distance between two dicts of PageRank values.
+    """
+    return float(sum(abs(ranks[page] - reference[page]) for page in reference))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import multiprocessing
+import os
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from pagerank import DAMPING, TOLERANCE, LinkMatrix, extract_links
+
+# Links per on-disk block; each worker holds one block's arrays at a time
+BLOCK_LINKS = 1 << 24
+
+# Pages per block when partitioning straight from a crawl, whose link
+# counts are not known in advance, and links buffered before they are
+# spilled to the files of their blocks
+BLOCK_PAGES = 1 << 20
+SPILL_LINKS = 1 << 22
+
+# Per-worker state, set by `init_block_worker`
+worker_state = None
+
+
+def main():
+    if len(sys.argv) not in [3, 4]:
+        sys.exit("Usage: python blocks.py corpus blocks [workers]")
+    workers = int(sys.argv[3]) if len(sys.argv) == 4 else os.cpu_count()
+
+    # Partition a link matrix saved by crawl.py, or else crawl a directory
+    # of HTML pages straight into blocks, unless already done
+    if not os.path.exists(os.path.join(sys.argv[2], "bounds.npy")):
+        if LinkMatrix.saved(sys.argv[1]):
+            partition(LinkMatrix.load(sys.argv[1]), sys.argv[2])
+        else:
+            partition_crawl(sys.argv[1], sys.argv[2], workers)
+    ranks = block_pagerank(sys.argv[2], DAMPING, workers)
+    print("PageRank Results from Block Iteration (top 10)")
+    for page in sorted(ranks, key=ranks.get, reverse=True)[:10]:
+        print(f"  {page}: {ranks[page]:.4f}")
+
+
+def partition(matrix, directory, block_links=BLOCK_LINKS):
+    """
+    Split a `LinkMatrix` (typically memory-mapped with `LinkMatrix.load`)
+    into blocks of consecutive target pages with about `block_links`
+    links each, written to `directory` one block at a time.
+
+    Block b covers pages `bounds[b]` to `bounds[b + 1]` and is stored as
+    its own CSR row pointers (starting from 0) and source page ids.
+
+    Building the matrix holds every link in memory; `partition_crawl`
+    writes the same blocks for a corpus whose links do not fit.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "pages.txt"), "w") as f:
+        for page in matrix.pages:
+            print(page, file=f)
+    np.save(os.path.join(directory, "out_degree.npy"), matrix.out_degree)
+
+    links = int(matrix.indptr[-1])
+    cuts = np.arange(block_links, links, block_links)
+    bounds = np.unique(np.concatenate((
+        [0], np.searchsorted(matrix.indptr, cuts), [len(matrix)]
+    )))
+    for b, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+        indptr = np.asarray(matrix.indptr[lo:hi + 1])
+        np.save(block_path(directory, b, "indptr"), indptr - indptr[0])
+        np.save(
+            block_path(directory, b, "sources"),
+            matrix.sources[indptr[0]:indptr[-1]]
+        )
+    np.save(os.path.join(directory, "bounds.npy"), bounds)
+
+
+def partition_crawl(corpus, directory, workers=None,
+                    block_pages=BLOCK_PAGES):
+    """
+    Crawl a directory of HTML pages like `crawl_links`, and write its
+    links to `directory` in blocks of `block_pages` consecutive target
+    pages, in the format of `partition`, without holding every link in
+    memory. Links are spilled to a file per block as they are extracted,
+    and each block's file is then sorted into CSR form on its own, so
+    only per-page arrays and one block's links are held at a time.
+    """
+    filenames = sorted(
+        filename for filename in os.listdir(corpus)
+        if filename.endswith(".html")
+    )
+    ids = {filename: i for i, filename in enumerate(filenames)}
+    paths = [os.path.join(corpus, filename) for filename in filenames]
+    n = len(filenames)
+
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "pages.txt"), "w") as f:
+        for page in filenames:
+            print(page, file=f)
+    bounds = np.append(np.arange(0, n, block_pages), n)
+    out_degree = np.zeros(n)
+
+    # Spill (source, target) pairs to the file of the target's block
+    spills = [
+        open(spill_path(directory, b), "wb") for b in range(len(bounds) - 1)
+    ]
+    try:
+        buffer = []
+        with multiprocessing.Pool(workers) as pool:
+            pages = pool.imap(extract_links, paths, chunksize=64)
+            for source, links in enumerate(pages):
+                for link in links:
+                    target = ids.get(link)
+                    if target is not None and target != source:
+                        buffer.extend((source, target))
+                        out_degree[source] += 1
+                if len(buffer) >= 2 * SPILL_LINKS:
+                    spill(buffer, bounds, spills)
+                    buffer = []
+        spill(buffer, bounds, spills)
+    finally:
+        for f in spills:
+            f.close()
+
+    # Sort each block's links by target page, keeping crawl order (by
+    # source page) within a target, as `LinkMatrix` does
+    dtype = np.int32 if n < 2 ** 31 else np.int64
+    for b, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+        links = np.fromfile(spill_path(directory, b), dtype=np.int64)
+        sources, targets = links.reshape(-1, 2).T
+        order = np.argsort(targets, kind="stable")
+        counts = np.bincount(targets - lo, minlength=hi - lo)
+        np.save(
+            block_path(directory, b, "indptr"),
+            np.concatenate(([0], np.cumsum(counts)))
+        )
+        np.save(
+            block_path(directory, b, "sources"),
+            sources[order].astype(dtype)
+        )
+        os.remove(spill_path(directory, b))
+    np.save(os.path.join(directory, "out_degree.npy"), out_degree)
+    np.save(os.path.join(directory, "bounds.npy"), bounds)
+
+
+def spill(buffer, bounds, spills):
+    """
+    Append the links in `buffer`, a flat list of source and target page
+    ids, to the open spill file of each target's block.
+    """
+    links = np.array(buffer, dtype=np.int64).reshape(-1, 2)
+    blocks = np.searchsorted(bounds, links[:, 1], side="right") - 1
+    order = np.argsort(blocks, kind="stable")
+    links = links[order]
+    starts = np.searchsorted(blocks[order], np.arange(len(spills) + 1))
+    for b, f in enumerate(spills):
+        links[starts[b]:starts[b + 1]].tofile(f)
+
+
+def spill_path(directory, b):
+    """
+    Return the path of the file links of block `b` are spilled to.
+    """
+    return os.path.join(directory, f"block{b}-links.bin")
+
+
+def block_path(directory, b, name):
+    """
+    Return the path of array `name` of block `b` in `directory`.
+    """
+    return os.path.join(directory, f"block{b}-{name}.npy")
+
+
+def block_pagerank(directory, damping_factor, workers=None,
+                   tolerance=TOLERANCE):
+    """
+    Return PageRank values for the blocks written by `partition` to
+    `directory`, as a dict like `iterate_pagerank`'s.
+    """
+    with open(os.path.join(directory, "pages.txt")) as f:
+        pages = f.read().splitlines()
+    ranks = block_ranks(directory, damping_factor, workers, tolerance)
+    return {page: float(rank) for page, rank in zip(pages, ranks)}
+
+
+def block_ranks(directory, damping_factor, workers=None, tolerance=TOLERANCE):
+    """
+    Run power iteration over the blocks in `directory` and return the
+    rank vector. Each iteration, the link share of every page is placed
+    in shared memory and a process pool computes the new ranks of each
+    block's pages straight into a second shared vector, mapping the
+    block's arrays from disk.
+    """
+    bounds = np.load(os.path.join(directory, "bounds.npy"))
+    out_degree = np.load(os.path.join(directory, "out_degree.npy"))
+    dangling = out_degree == 0
+    n = len(out_degree)
+
+    memory = [
+        shared_memory.SharedMemory(create=True, size=max(n, 1) * 8)
+        for _ in range(2)
+    ]
+    try:
+        share, new_ranks = (
+            np.ndarray(n, dtype=np.float64, buffer=block.buf)
+            for block in memory
+        )
+        ranks = np.full(n, 1 / n)
+        with multiprocessing.Pool(
+            workers, initializer=init_block_worker,
+            initargs=(directory, memory[0].name, memory[1].name, n)
+        ) as pool:
+            while True:
+                np.divide(ranks, out_degree, out=share, where=~dangling)
+                share[dangling] = 0
+                base = (
+                    (1 - damping_factor) / n
+                    + damping_factor * ranks[dangling].sum() / n
+                )
+                blocks = enumerate(zip(bounds[:-1], bounds[1:]))
+                pool.map(block_task, [
+                    (b, lo, hi, base, damping_factor)
+                    for b, (lo, hi) in blocks
+                ])
+                delta = np.abs(new_ranks - ranks).sum()
+                ranks = new_ranks.copy()
+                if delta < tolerance:
+                    return ranks
+    finally:
+        for block in memory:
+            block.close()
+            block.unlink()
+
+
+def init_block_worker(directory, share_name, ranks_name, n):
+    """
+    Attach a worker to the shared share and rank vectors.
+    """
+    global worker_state
+    memory = [
+        shared_memory.SharedMemory(name=name)
+        for name in (share_name, ranks_name)
+    ]
+    worker_state = {
+        "directory": directory,
+        "memory": memory,
+        "share": np.ndarray(n, dtype=np.float64, buffer=memory[0].buf),
+        "ranks": np.ndarray(n, dtype=np.float64, buffer=memory[1].buf),
+    }
+
+
+def block_task(job):
+    """
+    Compute new ranks for the pages of one block, given as (b, lo, hi,
+    base, damping_factor), where `base` is the rank every page receives
+    by teleporting and from dangling pages.
+    """
+    b, lo, hi, base, damping_factor = job
+    directory = worker_state["directory"]
+    indptr = np.load(block_path(directory, b, "indptr"), mmap_mode="r")
+    sources = np.load(block_path(directory, b, "sources"), mmap_mode="r")
+
+    received = np.zeros(hi - lo)
+    if len(sources):
+        starts = np.asarray(indptr[:-1])
+        nonempty = starts < indptr[1:]
+        received[nonempty] = np.add.reduceat(
+            worker_state["share"][sources], starts[nonempty]
+        )
+    worker_state["ranks"][lo:hi] = base + damping_factor * received
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import os
+import sys
+import time
+
+from pagerank import crawl_links
+
+
+def main():
+
+    # Check usage
+    if len(sys.argv) not in [3, 4]:
+        sys.exit("Usage: python crawl.py corpus output [workers]")
+    workers = int(sys.argv[3]) if len(sys.argv) == 4 else os.cpu_count()
+
+    # Crawl in parallel and save the link matrix for pagerank.py to map
+    start = time.perf_counter()
+    matrix = crawl_links(sys.argv[1], workers)
+    matrix.save(sys.argv[2])
+    print(f"Crawled {len(matrix)} pages with {len(matrix.sources)} links "
+          f"in {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,91 @@
+import multiprocessing
 import os
 import random
 import re
 import sys
+from collections import Counter
 import numpy as np
 
 DAMPING = 0.85
 SAMPLES = 100
+TOLERANCE = 1e-6
+
+# Random surfers stepped together by the vectorized sampler, the fewest
+# steps each surfer takes (so that starting pages do not bias the
+# estimate), and the number of visits buffered before they are counted
+WALKERS = 4096
+MIN_STEPS = 1000
+CHUNK = 1 << 20
+
+# Solvers selectable as the `method` of `iterate_pagerank`
+SOLVERS = ["sparse", "gauss-seidel", "aitken", "quadratic", "adaptive"]
+
+# Blocks of pages updated in turn by the Gauss-Seidel solver, the
+# number of iterations between steps of the extrapolating solvers, and
+# between full iterations of the adaptive solver
+SEIDEL_BLOCKS = 32
+EXTRAPOLATE_EVERY = 10
+ADAPTIVE_EVERY = 10
+
+# Links to other pages in an HTML file
+LINK = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
 
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
-    ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
+    args = sys.argv[1:]
+    compare = "--compare" in args
+    if compare:
+        args.remove("--compare")
+    if len(args) not in [1, 2]:
+        sys.exit(
+            "Usage: python pagerank.py corpus "
+            f"[dict|{'|'.join(SOLVERS)}] [--compare]"
+        )
+    method = args[1] if len(args) == 2 else "dict"
+    if method not in ["dict"] + SOLVERS:
+        sys.exit(f"Unknown method: {method}")
+
+    # A link matrix saved by crawl.py is mapped instead of crawling again,
+    # and the dict method does not apply to it
+    saved = LinkMatrix.saved(args[0])
+    if saved:
+        corpus = LinkMatrix.load(args[0])
+        if method == "dict":
+            method = "sparse"
+    else:
+        corpus = crawl(args[0])
+    ranks = sample_pagerank(corpus, DAMPING, SAMPLES, method)
     print(f"PageRank Results from Sampling (n = {SAMPLES})")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
-    ranks = iterate_pagerank(corpus, DAMPING)
-    print(f"PageRank Results from Iteration")
+
+    # Warm-start from the ranks of the previous run on a saved matrix:
+    # the chosen solver starts from them, or without a chosen method they
+    # are updated incrementally. --compare also counts the iterations of
+    # a cold start of the same solver ("sparse" for the update)
+    previous = load_ranks(args[0]) if saved else None
+    residuals = []
+    if previous is not None and len(args) == 1:
+        ranks, sweeps = update_pagerank(corpus, DAMPING, previous)
+        print("PageRank Results from Incremental Update")
+    else:
+        ranks = iterate_pagerank(corpus, DAMPING, method, residuals, previous)
+        print("PageRank Results from Iteration")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
+    if residuals:
+        print(f"Converged in {len(residuals)} iterations "
+              f"(final L1 residual {residuals[-1]:.2e})", end="")
+    elif previous is not None:
+        print(f"Incremental update took {sweeps:.1f} sweeps", end="")
+    if previous is not None and compare:
+        cold = []
+        iterate_pagerank(corpus, DAMPING, method, cold)
+        print(f" instead of {len(cold)} iterations from a cold start", end="")
+    if residuals or previous is not None:
+        print()
+    if saved:
+        save_ranks(args[0], ranks)
 
 
 def crawl(directory):
@@ -36,7 +102,7 @@ def crawl(directory):
             continue
         with open(os.path.join(directory, filename)) as f:
             contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
+            links = LINK.findall(contents)
             pages[filename] = set(links) - {filename}
 
     # Only include links to other pages in the corpus
@@ -49,6 +115,54 @@ def crawl(directory):
     return pages
 
 
+def crawl_links(directory, workers=None):
+    """
+    Parse a directory of HTML pages like `crawl`, but read each file in
+    chunks, extract links across a process pool, and return the result
+    as a `LinkMatrix` with page names interned to integer ids.
+    """
+    filenames = sorted(
+        filename for filename in os.listdir(directory)
+        if filename.endswith(".html")
+    )
+    ids = {filename: i for i, filename in enumerate(filenames)}
+    paths = [os.path.join(directory, filename) for filename in filenames]
+
+    sources = []
+    targets = []
+    with multiprocessing.Pool(workers) as pool:
+        pages = pool.imap(extract_links, paths, chunksize=64)
+        for source, links in enumerate(pages):
+            for link in links:
+                target = ids.get(link)
+                if target is not None and target != source:
+                    sources.append(source)
+                    targets.append(target)
+    return LinkMatrix.from_edges(filenames, sources, targets)
+
+
+def extract_links(path, chunk_size=1 << 16):
+    """
+    Return the set of links in the HTML file at `path`, reading it
+    `chunk_size` characters at a time. Text from the last unfinished tag
+    of a chunk is carried over into the next one.
+    """
+    links = set()
+    carry = ""
+    with open(path, errors="replace") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            text = carry + chunk
+            end = 0
+            for match in LINK.finditer(text):
+                links.add(match.group(1))
+                end = match.end()
+            if not chunk:
+                return links
+            tag = text.rfind("<", end)
+            carry = text[tag:] if tag != -1 else ""
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -76,7 +190,7 @@ def transition_model(corpus, page, damping_factor):
         pages_proba[link] = 1 / len(corpus)
     return pages_proba
 
-def sample_pagerank(corpus, damping_factor, n):
+def sample_pagerank(corpus, damping_factor, n, method="dict"):
     """
     Return PageRank values for each page by sampling `n` pages
     according to transition model, starting with a page at random.
@@ -84,7 +198,16 @@ def sample_pagerank(corpus, damping_factor, n):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    Any `method` in `SOLVERS` runs `walk_pagerank`, which moves many
+    random surfers at once over a `LinkMatrix` (which may be passed
+    instead of the corpus).
     """
+    if method in SOLVERS:
+        return walk_pagerank(corpus, damping_factor, n)
+    if method != "dict":
+        raise ValueError(f"Unknown method: {method}")
+
     pageranks = dict()
     samples = []
 
@@ -96,16 +219,265 @@ def sample_pagerank(corpus, damping_factor, n):
         selection = np.random.choice(list(pages.keys()), 1, p = list(pages.values()))
         samples.append(selection[0])
 
-    for object in corpus.keys():
-        count = 0
-        for i in range(len(samples)):
-            if object in samples[i]:
-                count += 1
-        pageranks[object] = count / len(samples)
+    counts = Counter(samples)
+    for page in corpus.keys():
+        pageranks[page] = counts[page] / len(samples)
 
     return pageranks
 
-def iterate_pagerank(corpus, damping_factor):
+
+def walk_pagerank(corpus, damping_factor, n, walkers=WALKERS, workers=1,
+                  seed=None):
+    """
+    Return PageRank values estimated from `n` samples taken by `walkers`
+    random surfers stepping together, each starting on a random page.
+    With `workers` above 1, the samples are split across a process pool
+    with independent random streams.
+    """
+    matrix = corpus if isinstance(corpus, LinkMatrix) else LinkMatrix(corpus)
+    streams = np.random.SeedSequence(seed).spawn(workers)
+    jobs = [
+        (matrix, damping_factor, n // workers + (k < n % workers),
+         walkers, stream)
+        for k, stream in enumerate(streams)
+    ]
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            visits = sum(pool.map(count_visits, jobs))
+    else:
+        visits = count_visits(jobs[0])
+    return matrix.ranks(visits / visits.sum())
+
+
+def count_visits(job):
+    """
+    Take the samples of one `walk_pagerank` job, given as (matrix,
+    damping_factor, n, walkers, seed), and return visits per page.
+    """
+    matrix, damping_factor, n, walkers, seed = job
+    rng = np.random.default_rng(seed)
+    pages = len(matrix)
+    walkers = max(1, min(walkers, n // MIN_STEPS))
+    visits = np.zeros(pages, dtype=np.int64)
+    buffered = []
+    size = 0
+
+    positions = rng.integers(pages, size=walkers)
+    taken = 0
+    while taken < n:
+        step = positions[:n - taken]
+        buffered.append(step)
+        size += len(step)
+        taken += len(step)
+        if size >= CHUNK or taken >= n:
+            visits += np.bincount(np.concatenate(buffered), minlength=pages)
+            buffered = []
+            size = 0
+
+        # Follow a random link with probability `damping_factor` unless
+        # the page has none, otherwise jump to a random page
+        degree = matrix.out_degree[positions].astype(np.int64)
+        follow = (rng.random(walkers) < damping_factor) & (degree > 0)
+        jump = rng.integers(pages, size=walkers)
+        if follow.any():
+            choice = (rng.random(walkers) * degree).astype(np.int64)
+            link = matrix.out_indptr[positions] + choice
+            jump[follow] = matrix.targets[link[follow]]
+        positions = jump
+    return visits
+
+
+class LinkMatrix():
+
+    # Arrays written by `save` and memory-mapped by `load`
+    ARRAYS = ["indptr", "sources", "out_indptr", "targets"]
+
+    def __init__(self, corpus):
+        """
+        Convert a corpus into a sparse link matrix in CSR form, rows being
+        link targets: the pages linking to `pages[i]` are
+        `sources[indptr[i]:indptr[i + 1]]`, as indices into `pages`.
+        `out_degree[j]` is the number of links on page j, and `dangling`
+        marks pages without links, which link to every page.
+        `targets` and `out_indptr` hold the same links in CSR form by
+        source page.
+        """
+        pages = sorted(corpus)
+        ids = {page: i for i, page in enumerate(pages)}
+        targets = []
+        sources = []
+        for page, links in corpus.items():
+            for link in links:
+                targets.append(ids[link])
+                sources.append(ids[page])
+        self.build(pages, sources, targets)
+
+    def build(self, pages, sources, targets):
+        """
+        Fill in the matrix from page names and parallel sequences of the
+        source and target page ids of every link.
+        """
+        self.path = None
+        self.csr = None
+        self.pages = pages
+        dtype = np.int32 if len(pages) < 2 ** 31 else np.int64
+        targets = np.asarray(targets, dtype=dtype)
+        sources = np.asarray(sources, dtype=dtype)
+        order = np.argsort(targets, kind="stable")
+        self.sources = sources[order]
+        counts = np.bincount(targets, minlength=len(pages))
+        self.indptr = np.concatenate(([0], np.cumsum(counts)))
+
+        # The same links by source, for following them forwards:
+        # page j links to `targets[out_indptr[j]:out_indptr[j + 1]]`
+        order = np.argsort(sources, kind="stable")
+        self.targets = targets[order]
+        counts = np.bincount(sources, minlength=len(pages))
+        self.out_indptr = np.concatenate(([0], np.cumsum(counts)))
+        self.degrees()
+
+    def degrees(self):
+        """
+        Derive out-degrees and the dangling-page mask from `out_indptr`.
+        """
+        self.out_degree = np.diff(self.out_indptr).astype(np.float64)
+        self.dangling = self.out_degree == 0
+
+    @classmethod
+    def from_edges(cls, pages, sources, targets):
+        """
+        Return the link matrix of `pages` with the given links by id.
+        """
+        matrix = cls.__new__(cls)
+        matrix.build(pages, sources, targets)
+        return matrix
+
+    def save(self, directory):
+        """
+        Write the matrix to `directory`: page names one per line in
+        pages.txt, and each of `ARRAYS` as a NumPy .npy file.
+        """
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "pages.txt"), "w") as f:
+            for page in self.pages:
+                print(page, file=f)
+        for name in LinkMatrix.ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Return the matrix saved in `directory`, with its link arrays
+        memory-mapped rather than read into memory.
+        """
+        matrix = cls.__new__(cls)
+        matrix.path = directory
+        with open(os.path.join(directory, "pages.txt")) as f:
+            matrix.pages = f.read().splitlines()
+        for name in LinkMatrix.ARRAYS:
+            setattr(matrix, name, np.load(
+                os.path.join(directory, f"{name}.npy"), mmap_mode="r"
+            ))
+        matrix.csr = None
+        matrix.degrees()
+        return matrix
+
+    @staticmethod
+    def saved(directory):
+        """
+        Return True if `directory` holds a matrix written by `save`.
+        """
+        return os.path.exists(os.path.join(directory, "indptr.npy"))
+
+    def __getstate__(self):
+        # Saved matrices are pickled by path and mapped again
+        if self.path is None:
+            return self.__dict__
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        if "pages" in state:
+            self.__dict__.update(state)
+        else:
+            self.__dict__.update(LinkMatrix.load(state["path"]).__dict__)
+
+    def __len__(self):
+        return len(self.pages)
+
+    def propagate(self, ranks):
+        """
+        Return the rank each page receives through links when page j
+        holds `ranks[j]`, with dangling pages spreading theirs evenly.
+        `ranks` may also be an N x K array of K rank vectors.
+        """
+        return self.follow(ranks) + ranks[self.dangling].sum(axis=0) / len(self)
+
+    def follow(self, ranks):
+        """
+        Return the rank each page receives through links alone (ignoring
+        dangling pages) when page j holds `ranks[j]`, for a vector or an
+        N x K array of rank vectors.
+        """
+        degree = self.out_degree.reshape((-1,) + (1,) * (ranks.ndim - 1))
+        share = np.divide(
+            ranks, degree,
+            out=np.zeros(ranks.shape), where=degree > 0
+        )
+        product = self.scipy_matrix()
+        if product is not None:
+            return product @ share
+        received = np.zeros(ranks.shape)
+        if len(self.sources):
+            starts = self.indptr[:-1]
+            nonempty = starts < self.indptr[1:]
+            received[nonempty] = np.add.reduceat(
+                share[self.sources], starts[nonempty], axis=0
+            )
+        return received
+
+    def scipy_matrix(self):
+        """
+        Return the links as a SciPy CSR matrix, built on first use, whose
+        product with a vector or N x K array avoids materializing one
+        value per link; return None if SciPy is not installed.
+        """
+        if self.csr is None:
+            try:
+                from scipy.sparse import csr_matrix
+            except ImportError:
+                self.csr = False
+            else:
+                self.csr = csr_matrix(
+                    (np.ones(len(self.sources)), self.sources, self.indptr),
+                    shape=(len(self), len(self))
+                )
+        return self.csr if self.csr is not False else None
+
+    def receive(self, ranks, rows):
+        """
+        Return the rank the pages in `rows` receive through links (not
+        counting dangling pages) when page j holds `ranks[j]`, and the
+        number of links followed to compute it.
+        """
+        index, lengths = segments(self.indptr, rows)
+        received = np.zeros(len(rows))
+        if len(index):
+            sources = self.sources[index]
+            share = ranks[sources] / self.out_degree[sources]
+            nonempty = lengths > 0
+            bounds = (np.cumsum(lengths) - lengths)[nonempty]
+            received[nonempty] = np.add.reduceat(share, bounds)
+        return received, len(index)
+
+    def ranks(self, values):
+        """
+        Return dict mapping page names to the entries of `values`.
+        """
+        return {page: float(value) for page, value in zip(self.pages, values)}
+
+
+def iterate_pagerank(corpus, damping_factor, method="dict", residuals=None,
+                     previous=None):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
@@ -113,7 +485,40 @@ def iterate_pagerank(corpus, damping_factor):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    Any other `method` than "dict" is one of `SOLVERS`, run over a
+    `LinkMatrix` (which may be passed instead of the corpus) until the
+    L1 residual falls below `TOLERANCE`:
+        * "sparse": vectorized power iteration
+        * "gauss-seidel": pages are updated in blocks, in place, each
+          block using the ranks already updated during the sweep
+        * "aitken", "quadratic": power iteration, extrapolated every
+          `EXTRAPOLATE_EVERY` iterations from the last 3 or 4 iterates
+        * "adaptive": pages whose rank has stopped changing are frozen
+          and no longer recomputed, until the next full iteration
+    If `residuals` is a list, the L1 residual of every iteration is
+    appended to it. Solvers start from `previous`, a dict of ranks
+    computed before the corpus changed, if given, like `update_pagerank`.
     """
+    if method in SOLVERS:
+        matrix = (
+            corpus if isinstance(corpus, LinkMatrix) else LinkMatrix(corpus)
+        )
+        solver = {
+            "sparse": power_iteration,
+            "gauss-seidel": gauss_seidel_iteration,
+            "aitken": aitken_iteration,
+            "quadratic": quadratic_iteration,
+            "adaptive": adaptive_iteration,
+        }[method]
+        ranks, _ = solver(
+            matrix, damping_factor, starting_ranks(matrix, previous),
+            residuals=residuals
+        )
+        return matrix.ranks(ranks)
+    if method != "dict":
+        raise ValueError(f"Unknown method: {method}")
+
     pageranks = dict()
     pageranks_new = dict()
     deltas = dict()
@@ -146,8 +551,343 @@ def iterate_pagerank(corpus, damping_factor):
         pageranks = pageranks_new.copy()
 
 
+def power_iteration(matrix, damping_factor, ranks, tolerance=TOLERANCE,
+                    residuals=None):
+    """
+    Run power iteration over `matrix` from the rank vector `ranks` until
+    successive vectors differ by less than `tolerance` in L1 norm.
+    Return the final vector and the number of iterations taken, and
+    append each iteration's L1 change to `residuals` if given.
+    """
+    iterations = 0
+    while True:
+        new_ranks = pagerank_step(matrix, damping_factor, ranks)
+        iterations += 1
+        delta = np.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        if residuals is not None:
+            residuals.append(float(delta))
+        if delta < tolerance:
+            return ranks, iterations
+
+
+def pagerank_step(matrix, damping_factor, ranks):
+    """
+    Return the rank vector after one iteration from `ranks`.
+    """
+    return (
+        (1 - damping_factor) / len(matrix)
+        + damping_factor * matrix.propagate(ranks)
+    )
+
+
+def gauss_seidel_iteration(matrix, damping_factor, ranks,
+                           tolerance=TOLERANCE, residuals=None):
+    """
+    Like `power_iteration`, but sweep the pages in `SEIDEL_BLOCKS`
+    blocks, updating each block in place from the latest ranks of every
+    page, including those already updated earlier in the sweep.
+    """
+    n = len(matrix)
+    ranks = ranks.copy()
+    bounds = np.linspace(0, n, min(SEIDEL_BLOCKS, n) + 1).astype(np.int64)
+    iterations = 0
+    while True:
+        dangling_mass = ranks[matrix.dangling].sum()
+        delta = 0
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            received, _ = matrix.receive(ranks, np.arange(lo, hi))
+            new_ranks = (
+                (1 - damping_factor) / n
+                + damping_factor * (received + dangling_mass / n)
+            )
+            change = new_ranks - ranks[lo:hi]
+            delta += np.abs(change).sum()
+            dangling_mass += change[matrix.dangling[lo:hi]].sum()
+            ranks[lo:hi] = new_ranks
+        # In-place sweeps do not preserve the total rank, and its drift
+        # only decays by the damping factor per sweep unless removed
+        ranks /= ranks.sum()
+        iterations += 1
+        if residuals is not None:
+            residuals.append(float(delta))
+        if delta < tolerance:
+            return ranks, iterations
+
+
+def aitken_iteration(matrix, damping_factor, ranks, tolerance=TOLERANCE,
+                     residuals=None):
+    """
+    Like `power_iteration`, with Aitken extrapolation from the last three
+    iterates every `EXTRAPOLATE_EVERY` iterations.
+    """
+    return extrapolated_iteration(
+        matrix, damping_factor, ranks, tolerance, residuals,
+        aitken_extrapolation, 3
+    )
+
+
+def quadratic_iteration(matrix, damping_factor, ranks, tolerance=TOLERANCE,
+                        residuals=None):
+    """
+    Like `power_iteration`, with quadratic extrapolation from the last
+    four iterates every `EXTRAPOLATE_EVERY` iterations.
+    """
+    return extrapolated_iteration(
+        matrix, damping_factor, ranks, tolerance, residuals,
+        quadratic_extrapolation, 4
+    )
 
 
+def extrapolated_iteration(matrix, damping_factor, ranks, tolerance,
+                           residuals, extrapolate, order):
+    """
+    Run power iteration, replacing the current iterate every
+    `EXTRAPOLATE_EVERY` iterations by `extrapolate` applied to the last
+    `order` iterates, renormalized to a probability distribution.
+    """
+    history = [ranks]
+    iterations = 0
+    while True:
+        new_ranks = pagerank_step(matrix, damping_factor, ranks)
+        iterations += 1
+        delta = np.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        if residuals is not None:
+            residuals.append(float(delta))
+        if delta < tolerance:
+            return ranks, iterations
+
+        history = history[-(order - 1):] + [ranks]
+        if iterations % EXTRAPOLATE_EVERY == 0 and len(history) == order:
+            ranks = np.maximum(extrapolate(*history), 0)
+            ranks /= ranks.sum()
+            history = [ranks]
+
+
+def aitken_extrapolation(x0, x1, x2):
+    """
+    Return the Aitken delta-squared extrapolation of three successive
+    iterates, componentwise, keeping `x2` where it is undefined.
+    """
+    second = x2 - 2 * x1 + x0
+    defined = np.abs(second) > 1e-15
+    result = x2.copy()
+    result[defined] -= (x2 - x1)[defined] ** 2 / second[defined]
+    return result
+
+
+def quadratic_extrapolation(x0, x1, x2, x3):
+    """
+    Return the quadratic extrapolation of four successive iterates
+    (Kamvar et al.), which assumes the iterates are a combination of
+    the limit and the next two eigenvectors.
+    """
+    y = np.column_stack((x1 - x0, x2 - x0))
+    (gamma1, gamma2), *_ = np.linalg.lstsq(y, -(x3 - x0), rcond=None)
+    gamma3 = 1
+    return (
+        (gamma1 + gamma2 + gamma3) * x1
+        + (gamma2 + gamma3) * x2
+        + gamma3 * x3
+    )
+
+
+def adaptive_iteration(matrix, damping_factor, ranks, tolerance=TOLERANCE,
+                       residuals=None):
+    """
+    Like `power_iteration`, but stop recomputing pages whose rank
+    changed by less than `tolerance` times its value in the last
+    iteration. Every `ADAPTIVE_EVERY` iterations, and once every page is
+    frozen, a full iteration checks convergence and makes the pages that
+    still change active again; frozen pages would otherwise hold the
+    ranks of active ones back.
+
+    This follows fewer links than power iteration (about half on slowly
+    converging graphs), but each partial iteration costs more per link
+    than a full one, so it is not necessarily faster.
+    """
+    n = len(matrix)
+    ranks = ranks.copy()
+    active = np.arange(n)
+    iterations = 0
+    while True:
+        if len(active) < n:
+            received, _ = matrix.receive(ranks, active)
+            dangling_mass = ranks[matrix.dangling].sum()
+            new_ranks = (
+                (1 - damping_factor) / n
+                + damping_factor * (received + dangling_mass / n)
+            )
+        else:
+            new_ranks = pagerank_step(matrix, damping_factor, ranks)
+        change = np.abs(new_ranks - ranks[active])
+        ranks[active] = new_ranks
+        # Frozen pages miss changes in the dangling mass, so the total
+        # rank drifts unless restored
+        ranks /= ranks.sum()
+        iterations += 1
+        if residuals is not None:
+            residuals.append(float(change.sum()))
+        if len(active) == n and change.sum() < tolerance:
+            return ranks, iterations
+
+        active = active[change >= tolerance * ranks[active]]
+        if not len(active) or iterations % ADAPTIVE_EVERY == 0:
+            active = np.arange(n)
+
+
+def personalized_pagerank(corpus, damping_factor, seeds,
+                          tolerance=TOLERANCE):
+    """
+    Return personalized PageRank values for a corpus or `LinkMatrix`,
+    one dict of ranks per entry of `seeds`. Each entry is a set of page
+    names, teleported to uniformly, or a dict mapping page names to
+    teleport weights. Raise ValueError if an entry has no pages, a
+    negative weight or only zero weights.
+    """
+    matrix = corpus if isinstance(corpus, LinkMatrix) else LinkMatrix(corpus)
+    ids = {page: i for i, page in enumerate(matrix.pages)}
+    teleport = np.zeros((len(matrix), len(seeds)))
+    for k, seed in enumerate(seeds):
+        weights = seed if isinstance(seed, dict) else dict.fromkeys(seed, 1)
+        for page, weight in weights.items():
+            if page not in ids:
+                raise ValueError(f"Unknown seed page: {page}")
+            if weight < 0:
+                raise ValueError(f"Negative weight for seed page: {page}")
+            teleport[ids[page], k] = weight
+        if not teleport[:, k].sum() > 0:
+            raise ValueError(f"Seed entry {k} has no pages with weight")
+    ranks = personalized_ranks(matrix, damping_factor, teleport, tolerance)
+    return [matrix.ranks(ranks[:, k]) for k in range(len(seeds))]
+
+
+def personalized_ranks(matrix, damping_factor, teleport, tolerance=TOLERANCE):
+    """
+    Return an N x K array of personalized PageRank vectors over `matrix`,
+    column k using column k of the N x K array `teleport` (normalized
+    here) as its teleport distribution. Rank leaving dangling pages
+    follows the teleport distribution too.
+
+    All K vectors are iterated together, so each iteration is a single
+    pass over the links, until every vector changes by less than
+    `tolerance` in L1 norm.
+    """
+    teleport = teleport / teleport.sum(axis=0)
+    ranks = teleport.copy()
+    while True:
+        dangling = ranks[matrix.dangling].sum(axis=0)
+        new_ranks = (
+            (1 - damping_factor) * teleport
+            + damping_factor * (matrix.follow(ranks) + teleport * dangling)
+        )
+        delta = np.abs(new_ranks - ranks).sum(axis=0).max()
+        ranks = new_ranks
+        if delta < tolerance:
+            return ranks
+
+
+def update_pagerank(corpus, damping_factor, previous, tolerance=TOLERANCE):
+    """
+    Return PageRank values for a corpus or `LinkMatrix`, starting from
+    `previous`, a dict of ranks computed before the corpus changed.
+    Pages new to the corpus start at 1 / N.
+
+    Rather than sweeping every page, only pages whose residual (the
+    change one iteration would make to them) exceeds `tolerance` / N are
+    updated, and residuals are then recomputed only for the pages they
+    link to. Iteration stops once the residuals sum below `tolerance`.
+
+    Return (ranks, sweeps), where sweeps is the work done measured in
+    full passes over the links, to compare with cold power iteration.
+    """
+    matrix = corpus if isinstance(corpus, LinkMatrix) else LinkMatrix(corpus)
+    n = len(matrix)
+    edges = max(len(matrix.sources), 1)
+    ranks = starting_ranks(matrix, previous)
+
+    residual = (
+        (1 - damping_factor) / n
+        + damping_factor * matrix.propagate(ranks) - ranks
+    )
+    dangling_mass = ranks[matrix.dangling].sum()
+    work = edges
+    while np.abs(residual).sum() >= tolerance:
+        active = np.flatnonzero(np.abs(residual) > tolerance / n)
+        if not len(active):
+            active = np.flatnonzero(residual)
+        change = residual[active]
+        ranks[active] += change
+
+        # Rank moved through dangling pages reaches every page equally
+        moved = change[matrix.dangling[active]].sum()
+        if moved:
+            dangling_mass += moved
+            residual += damping_factor * moved / n
+
+        # Recompute residuals of the changed pages and those they link to
+        index, _ = segments(matrix.out_indptr, active)
+        affected = np.union1d(matrix.targets[index], active)
+        received, links = matrix.receive(ranks, affected)
+        residual[affected] = (
+            (1 - damping_factor) / n
+            + damping_factor * (received + dangling_mass / n)
+            - ranks[affected]
+        )
+        work += len(index) + links
+
+    return matrix.ranks(ranks), work / edges
+
+
+def starting_ranks(matrix, previous=None):
+    """
+    Return the rank vector iteration over `matrix` starts from: the
+    ranks in the dict `previous`, with pages new to the corpus at 1 / N,
+    renormalized, or else 1 / N for every page.
+    """
+    n = len(matrix)
+    if previous is None:
+        return np.full(n, 1 / n)
+    ranks = np.array([previous.get(page, 1 / n) for page in matrix.pages])
+    return ranks / ranks.sum()
+
+
+def segments(indptr, rows):
+    """
+    Return the positions of all entries of the given rows of a CSR
+    structure with row pointers `indptr`, and the length of each row.
+    """
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return np.arange(lengths.sum()) + offsets, lengths
+
+
+def save_ranks(directory, ranks):
+    """
+    Save a dict of ranks to ranks.tsv in `directory`, next to a saved
+    `LinkMatrix`, for use as the starting point of `update_pagerank`.
+    """
+    with open(os.path.join(directory, "ranks.tsv"), "w") as f:
+        for page, rank in ranks.items():
+            print(f"{page}\t{rank!r}", file=f)
+
+
+def load_ranks(directory):
+    """
+    Return the dict of ranks saved in `directory`, or None if there is none.
+    """
+    path = os.path.join(directory, "ranks.tsv")
+    if not os.path.exists(path):
+        return None
+    ranks = dict()
+    with open(path) as f:
+        for line in f:
+            page, rank = line.rstrip("\n").rsplit("\t", 1)
+            ranks[page] = float(rank)
+    return ranks
+
 
 if __name__ == "__main__":
     main()